@@ -1,151 +1,675 @@
 """Karger analysis v19.01.19 by JernejP"""
 
+import os
+import re
 import sys
+import struct
+import tempfile
+import warnings
 import numpy as np
+from glob import glob, escape as glob_escape
+from heapq import heappush, heappop
 from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import matplotlib.pyplot as plt
 
 
+# Streaming log header: magic bytes and uint32 record width
+LOG_MAGIC = b'KAL1'
+LOG_HEAD = 8
+
+# Graph sidecar suffix: .<size>-<mtime_ns>.<dtype>.npy
+SIDECAR = re.compile(r'\.\d+-\d+\.\w+\.npy')
+
+# Stoer-Wagner keeps a dense weight matrix up to this many vertices
+SW_DENSE = 4096
+
+# Karger-Stein recursion switches to plain Python lists below this many vertices
+STEIN_SMALL = 32
+
+
 ###############################################################################
 # Core
 
-def karger(numv, edges):
-    """Efficient Karger's alg. implementation (numpy magic)"""
-    E = edges.copy()
+def karger(numv, edges, engine='numpy'):
+    """Efficient Karger's alg. implementation (numpy magic or union-find)"""
+    if engine == 'uf':
+        parent = contract_uf(numv, edges)
+        return uf_cut(numv, edges, parent)
 
-    for _ in range(numv-2):
-        u, v = E[np.random.randint(E.shape[0]),:]
-        E = E[np.logical_and(np.logical_or(E[:,0] != u, E[:,1] != v),
-                             np.logical_or(E[:,1] != u, E[:,0] != v))]
-        E = np.where(E==v, u, E)
-
-    return E.shape[0]
+    check_engine(engine)
+    cut, _ = contract_np(numv, edges)
+    return cut
 
 
-def cut_groups(numv, edges):
+def cut_groups(numv, edges, engine='numpy'):
     """Yield vertex groups of a random cut (mincut or close)"""
-    V = {}
-    E = edges.copy()
+    if engine == 'uf':
+        parent = contract_uf(numv, edges)
+    else:
+        check_engine(engine)
+        _, parent = contract_np(numv, edges)
+
+    return uf_groups(numv, parent)
 
-    for i in range(1, numv+1):
-        V[i] = [i]
-    
-    for _ in range(numv-2):
-        u, v = E[np.random.randint(E.shape[0]),:]
-        V[u] += V[v]
-        del V[v]
-        E = E[np.logical_and(np.logical_or(E[:,0] != u, E[:,1] != v),
-                             np.logical_or(E[:,1] != u, E[:,0] != v))]
-        E = np.where(E==v, u, E)
-    
-    groups = list(V.values())
-    return sorted(groups[0]), sorted(groups[1])
 
+def mincut_groups(numv, edges, opt=None, engine='numpy'):
+    """Contract until mincut found, then unpack into vertex groups"""
+    check_engine(engine)
+
+    if opt is None:
+        opt, _, _ = stoer_wagner(numv, edges)
 
-def mincut_groups(numv, edges, opt):
-    """Index until mincut found, then unpack into vertex groups"""
-    H = np.empty([1,numv-2], dtype=int)
     cut = 0
 
     while cut != opt:
-        E = edges.copy()
-
-        for t in range(numv-2):
-            i = np.random.randint(E.shape[0])
-            u, v = E[i,:]
-            E = E[np.logical_and(np.logical_or(E[:,0] != u, E[:,1] != v),
-                                 np.logical_or(E[:,1] != u, E[:,0] != v))]
-            E = np.where(E==v, u, E)
-            H[0,t] = i
-        
-        cut = E.shape[0]
-    
-    V = {}
+        if engine == 'uf':
+            parent = contract_uf(numv, edges)
+            cut = uf_cut(numv, edges, parent)
+        else:
+            cut, parent = contract_np(numv, edges)
+
+    return uf_groups(numv, parent)
+
+
+def check_engine(engine, engines=('numpy', 'uf')):
+    """Raise on contraction engines that are not implemented"""
+    if engine not in engines:
+        raise ValueError('Unknown engine: ' + str(engine))
+
+
+def contract_np(numv, edges):
+    """Contract by rebuilding the edge array, track merges in a parent array"""
+    parent = list(range(numv+1))
     E = edges.copy()
 
-    for i in range(1, numv+1):
-        V[i] = [i]
-    
-    for t in range(numv-2):
-        u, v = E[H[0,t],:]
-        V[u] += V[v]
-        del V[v]
+    for _ in range(numv-2):
+        u, v = E[np.random.randint(E.shape[0]),:].tolist()
+        parent[v] = u
         E = E[np.logical_and(np.logical_or(E[:,0] != u, E[:,1] != v),
                              np.logical_or(E[:,1] != u, E[:,0] != v))]
         E = np.where(E==v, u, E)
-    
-    groups = list(V.values())
-    return sorted(groups[0]), sorted(groups[1])
+
+    return E.shape[0], parent
+
+
+def karger_stein(numv, edges, weights=None):
+    """Karger-Stein recursive contraction, return best cut of both branches"""
+    # Recurse on a weighted graph, parallel edges are merged into weights
+    if weights is None:
+        edges, weights = merge_parallel(numv, edges)
+
+    # Most calls are on small graphs, where numpy overhead dominates
+    if numv <= STEIN_SMALL or not len(weights):
+        return stein_small(numv, list(zip(*edges.T.tolist(),
+                                          weights.tolist())))
+
+    target = int(np.ceil(1 + numv/np.sqrt(2)))
+    cut = int(weights.sum())
+
+    for _ in range(2):
+        numt, E, W = uf_contract(numv, edges, target, weights)
+        cut = min(cut, karger_stein(numt, E, W))
+
+    return cut
+
+
+def stein_small(numv, edges):
+    """Karger-Stein on a small graph given as a list of (u, v, weight)"""
+    target = 2 if numv <= 6 else int(np.ceil(1 + numv/np.sqrt(2)))
+    cut = sum(w for _, _, w in edges)
+
+    if not cut:
+        return 0
+
+    for _ in range(1 if numv <= 6 else 2):
+        # Exponential clocks: first edge is picked in proportion to weight
+        keys = np.random.standard_exponential(len(edges)).tolist()
+        order = sorted(range(len(edges)), key=lambda i: keys[i]/edges[i][2])
+        parent = list(range(numv+1))
+        comps = numv
+
+        for i in order:
+            if comps == target:
+                break
+
+            u = find(parent, edges[i][0])
+            v = find(parent, edges[i][1])
+
+            if u != v:
+                parent[v] = u
+                comps -= 1
+
+        # Relabel components 1..target and merge parallel edges
+        label = {}
+        L = [0] + [label.setdefault(find(parent, u), len(label)+1)
+                   for u in range(1, numv+1)]
+        merged = {}
+
+        for u, v, w in edges:
+            u, v = L[u], L[v]
+
+            if u != v:
+                key = (u, v) if u < v else (v, u)
+                merged[key] = merged.get(key, 0) + w
+
+        if target == 2:
+            cut = min(cut, sum(merged.values()))
+        else:
+            cut = min(cut, stein_small(len(label),
+                                       [(u, v, w) for (u, v), w in
+                                        merged.items()]))
+
+    return cut
+
+
+def stoer_wagner(numv, edges):
+    """Exact min-cut (Stoer-Wagner), return cut size and vertex groups"""
+    if numv < 2:
+        return 0, list(range(1, numv+1)), []
+
+    # A dense matrix takes 8*numv^2 bytes, large graphs stay sparse
+    if numv > SW_DENSE:
+        return stoer_wagner_sparse(numv, edges)
+
+    # Dense weight matrix of merged vertices, parallel edges add up
+    E = np.asarray(edges, dtype=np.int64) - 1
+    E = E[E[:,0] != E[:,1]]
+    W = np.bincount(E[:,0]*numv + E[:,1], minlength=numv*numv)
+    W = W.reshape(numv, numv)
+    W += W.T
+
+    # Merged vertex of each original vertex, start from the best single one
+    label = np.arange(numv)
+    best = int(W.sum(axis=1).min())
+    group = label == np.argmin(W.sum(axis=1))
+    done = -2**62
+
+    while W.shape[0] > 1 and best:
+        # Maximum adjacency ordering, visited keys are pushed far below zero
+        k = W.shape[0]
+        key = np.zeros(k, dtype=np.int64)
+        merge = []
+        s = t = None
+
+        for step in range(k):
+            u = int(np.argmax(key))
+
+            # Disconnected graph: the visited component is a zero cut
+            if step and key[u] == 0:
+                best = 0
+                group = np.isin(label, np.flatnonzero(key < 0))
+                break
+
+            s, t = t, u
+            phase_cut = int(key[u])
+            key[u] = done
+            key += W[u]
+
+            # An edge that brings a key to at least the best cut joins two
+            # vertices no better cut separates (Nagamochi-Ibaraki)
+            if best:
+                merge += [(u, v) for v in np.flatnonzero((W[u] > 0) &
+                                                         (key >= best)).tolist()]
+
+        if not best:
+            break
+
+        if phase_cut < best:
+            best = phase_cut
+            group = label == t
+
+        # Merge the last two vertices of the ordering and contractible edges
+        parent = list(range(k))
+        merge.append((s, t))
+
+        for u, v in merge:
+            u, v = find(parent, u), find(parent, v)
+            parent[max(u, v)] = min(u, v)
+
+        roots = [find(parent, u) for u in range(k)]
+        _, new = np.unique(roots, return_inverse=True)
+        label = new[label]
+
+        # Add up rows and columns of merged vertices
+        order = np.argsort(new, kind='stable')
+        starts = np.searchsorted(new[order], np.arange(new.max()+1))
+        W = np.add.reduceat(W[order], starts, axis=0)
+        W = np.add.reduceat(W[:,order], starts, axis=1)
+        np.fill_diagonal(W, 0)
+
+    a = group == group[0]
+
+    return best, (np.flatnonzero(a) + 1).tolist(), (np.flatnonzero(~a) + 1).tolist()
+
+
+def stoer_wagner_sparse(numv, edges):
+    """Exact min-cut (Stoer-Wagner) over adjacency dicts and a lazy heap"""
+    # Compact weighted adjacency: parallel edges collapse into weights
+    G = {v: {} for v in range(1, numv+1)}
+    E, W = merge_parallel(numv, edges)
+
+    for (u, v), w in zip(E.tolist(), W.tolist()):
+        G[u][v] = w
+        G[v][u] = w
+
+    V = {v: [v] for v in G}
+    best, u = min((sum(G[v].values()), v) for v in G)
+    group = [u]
+
+    while len(G) > 1 and best:
+        # Maximum adjacency ordering with a lazy max-heap
+        key = dict.fromkeys(G, 0)
+        heap = [(0, next(iter(G)))]
+        seen = set()
+        merge = []
+        s = t = None
+
+        while heap:
+            k, u = heappop(heap)
+
+            if u in seen:
+                continue
+
+            seen.add(u)
+            s, t = t, u
+            phase_cut = -k
+
+            for v, w in G[u].items():
+                if v not in seen:
+                    key[v] += w
+                    heappush(heap, (-key[v], v))
+
+                    # Nagamochi-Ibaraki: no cut below best separates u and v
+                    if key[v] >= best:
+                        merge.append((u, v))
+
+        # Disconnected graph: the reached component is a zero cut
+        if len(seen) < len(G):
+            best = 0
+            group = [i for u in seen for i in V[u]]
+            break
+
+        if phase_cut < best:
+            best = phase_cut
+            group = list(V[t])
+
+        # Merge the last two vertices of the ordering and contractible edges
+        merged = {}
+        merge.append((s, t))
+
+        for u, v in merge:
+            while u in merged:
+                u = merged[u]
+
+            while v in merged:
+                v = merged[v]
+
+            if u == v:
+                continue
+
+            if len(V[u]) < len(V[v]):
+                u, v = v, u
+
+            for x, w in G.pop(v).items():
+                del G[x][v]
+
+                if x != u:
+                    G[u][x] = G[u].get(x, 0) + w
+                    G[x][u] = G[u][x]
+
+            V[u] += V.pop(v)
+            merged[v] = u
+
+    a = np.zeros(numv+1, dtype=bool)
+    a[group] = True
+    a = a[1:] == a[1]
+
+    return best, (np.flatnonzero(a) + 1).tolist(), (np.flatnonzero(~a) + 1).tolist()
+
+
+###############################################################################
+# Union-find
+
+def find(parent, u):
+    """Find set representative (with path halving)"""
+    while parent[u] != u:
+        parent[u] = parent[parent[u]]
+        u = parent[u]
+
+    return u
+
+
+def contract_uf(numv, edges, target=2, weights=None):
+    """Contract edges in random order until target components remain"""
+    parent = list(range(numv+1))
+    rank = [0]*(numv+1)
+    comps = numv
+
+    # Uniform pick among remaining edges == first unused edge of a permutation,
+    # an edge of weight w comes first as often as the first of w parallel ones
+    if weights is None:
+        order = np.random.permutation(edges.shape[0])
+    else:
+        order = np.argsort(np.random.standard_exponential(len(weights)) /
+                           weights)
+
+    for u, v in edges[order].tolist():
+        if comps == target:
+            break
+
+        u = find(parent, u)
+        v = find(parent, v)
+
+        if u == v:
+            continue
+
+        # Union by rank
+        if rank[u] < rank[v]:
+            u, v = v, u
+
+        parent[v] = u
+
+        if rank[u] == rank[v]:
+            rank[u] += 1
+
+        comps -= 1
+
+    return parent
+
+
+def uf_labels(numv, parent):
+    """Map each vertex to its set representative (by pointer jumping)"""
+    L = np.array(parent)
+    P = L[L]
+
+    while not np.array_equal(P, L):
+        L = P
+        P = L[L]
+
+    return L
+
+
+def uf_cut(numv, edges, parent, weights=None):
+    """Count (or weigh) edges crossing between contracted components"""
+    L = uf_labels(numv, parent)
+    cross = L[edges[:,0]] != L[edges[:,1]]
+
+    if weights is None:
+        return int(np.count_nonzero(cross))
+
+    return int(weights[cross].sum())
+
+
+def uf_contract(numv, edges, target, weights):
+    """Contract to target vertices, relabel them and merge parallel edges"""
+    parent = contract_uf(numv, edges, target, weights)
+    R = uf_labels(numv, parent)
+    L = np.cumsum(R == np.arange(numv+1)) - 1
+    L = L[R]
+    numt = int(L.max())
+    E, W = merge_parallel(numt, L[edges], weights)
+
+    return numt, E, W
+
+
+def merge_parallel(numv, edges, weights=None):
+    """Drop self-loops and merge parallel edges, return edges and weights"""
+    E = np.sort(np.asarray(edges, dtype=np.int64), axis=1)
+    keep = E[:,0] != E[:,1]
+    E = E[keep]
+    keys, inverse = np.unique(E[:,0]*(numv+1) + E[:,1], return_inverse=True)
+
+    if weights is None:
+        W = np.bincount(inverse, minlength=len(keys))
+    else:
+        W = np.bincount(inverse, weights=weights[keep],
+                        minlength=len(keys)).astype(np.int64)
+
+    return np.column_stack((keys // (numv+1), keys % (numv+1))), W
+
+
+def uf_groups(numv, parent):
+    """Unpack contracted components into vertex groups"""
+    L = uf_labels(numv, parent)[1:]
+    a = L == L[0]
+
+    return (np.flatnonzero(a) + 1).tolist(), (np.flatnonzero(~a) + 1).tolist()
+
+
+###############################################################################
+# Batched
+
+def karger_batch(numv, edges, batch):
+    """Run a batch of independent contractions at once, return their cuts"""
+    # Kruskal on random priorities: contract edges of each row in sorted order
+    order = np.argsort(np.random.random([batch, edges.shape[0]]), axis=1)
+    parent = np.tile(np.arange(numv+1), (batch, 1))
+    rank = np.zeros([batch, numv+1], dtype='uint8')
+    comps = np.full(batch, numv)
+
+    for t in range(order.shape[1]):
+        rows = np.flatnonzero(comps > 2)
+
+        if not rows.size:
+            break
+
+        e = order[rows, t]
+        u = batch_find(parent, rows, edges[e,0])
+        v = batch_find(parent, rows, edges[e,1])
+
+        # Skip self-loops
+        m = u != v
+        rows, u, v = rows[m], u[m], v[m]
+
+        # Union by rank
+        swap = rank[rows, u] < rank[rows, v]
+        u, v = np.where(swap, v, u), np.where(swap, u, v)
+        parent[rows, v] = u
+
+        m = rank[rows, u] == rank[rows, v]
+        rank[rows[m], u[m]] += 1
+        comps[rows] -= 1
+
+    # Pointer jumping until every vertex points to its representative
+    P = np.take_along_axis(parent, parent, axis=1)
+
+    while not np.array_equal(P, parent):
+        parent = P
+        P = np.take_along_axis(parent, parent, axis=1)
+
+    return np.count_nonzero(parent[:,edges[:,0]] != parent[:,edges[:,1]],
+                            axis=1)
+
+
+def batch_find(parent, rows, u):
+    """Find set representatives of one vertex per row (with path halving)"""
+    p = parent[rows, u]
+
+    while not np.array_equal(p, u):
+        parent[rows, u] = parent[rows, p]
+        u = parent[rows, u]
+        p = parent[rows, u]
+
+    return u
 
 
 ###############################################################################
 # Analytics
 
-def single_run(numv, edges, opt):
-    """Produce typical run data for later analysis"""
+def trial_cut(numv, edges, engine='numpy'):
+    """Single trial: one contraction pass or one Karger-Stein recursion"""
+    if engine == 'stein':
+        return karger_stein(numv, edges)
+
+    return karger(numv, edges, engine=engine)
+
+
+def trial_cuts(numv, edges, engine='numpy', batch=1024):
+    """Endless stream of independent trial cuts"""
+    check_engine(engine, ('numpy', 'uf', 'stein', 'batch'))
+
+    if engine == 'batch':
+        # Keep a (batch, edges) block of priorities within a sane memory bound
+        batch = max(1, min(batch, 2**24 // max(edges.shape[0], 1)))
+
+        while True:
+            yield from karger_batch(numv, edges, batch).tolist()
+
+    while True:
+        yield trial_cut(numv, edges, engine=engine)
+
+
+def single_run(numv, edges, opt=None, engine='numpy', log=None):
+    """Produce typical run data for later analysis (or stream it into log)"""
+    if opt is None:
+        opt, _, _ = stoer_wagner(numv, edges)
+
     cuts = []
     bestcuts = []
     bestcut = len(edges)
+    trials = trial_cuts(numv, edges, engine=engine)
     j = 0
 
-    while bestcut != opt:
-        cut = karger(numv, edges)
-        cuts.append(cut)
+    with RunLog(log, 2) as runlog:
+        # A log holds one run, resuming continues from its best cut so far
+        if runlog.resumed:
+            bestcut = int(read_log(log)[-1,1])
 
-        if cut < bestcut:
-            bestcut = cut
-        
-        bestcuts.append(bestcut)
+        while bestcut != opt:
+            cut = next(trials)
+
+            if cut < bestcut:
+                bestcut = cut
+
+            j += 1
+
+            if log is None:
+                cuts.append(cut)
+                bestcuts.append(bestcut)
+                print(j, cut)
+            else:
+                runlog.write(cut, bestcut)
+
+    if log is not None:
+        cuts, bestcuts = read_run(log)
 
-        j += 1
-        print(j, cut)
-    
     return cuts, bestcuts
 
 
-def multi_run(numv, edges, opt, runs):
-    """Produce distribution data for later analysis"""
+def multi_run(numv, edges, opt, runs, engine='numpy', log=None):
+    """Produce distribution data for later analysis (opt=None: exact mincut)"""
+    if opt is None:
+        opt, _, _ = stoer_wagner(numv, edges)
+
     run_data = np.empty([1,runs], dtype=int)
+    trials = trial_cuts(numv, edges, engine=engine)
 
-    for i in range(runs):
-        cut = 0
-        j = 0
+    with RunLog(log, 1) as runlog:
+        for i in range(runs):
+            cut = 0
+            j = 0
 
-        while cut != opt:
-            cut = karger(numv, edges)
-            j += 1
-        
-        run_data[0,i] = j
-        print(i, j)
+            while cut != opt:
+                cut = next(trials)
+                j += 1
+
+            run_data[0,i] = j
+
+            if log is None:
+                print(i, j)
+            else:
+                runlog.write(j)
 
     return np.bincount(run_data[0,:])
 
 
-def time_run(numv, edges):
-    """Measure single pass performance"""
+def multi_run_parallel(numv, edges, opt, runs, engine='numpy', workers=None,
+                       seed=None, log=None):
+    """Produce distribution data with runs spread over a process pool"""
+    if opt is None:
+        opt, _, _ = stoer_wagner(numv, edges)
+
+    # Each run gets its own child seed, so results do not depend on scheduling
+    seeds = np.random.SeedSequence(seed).spawn(runs)
+    shm = shared_memory.SharedMemory(create=True, size=max(edges.nbytes, 1))
+
+    try:
+        E = np.ndarray(edges.shape, dtype=edges.dtype, buffer=shm.buf)
+        E[:] = edges
+
+        with ProcessPoolExecutor(workers, initializer=attach_edges,
+                                 initargs=(shm.name, edges.shape,
+                                           edges.dtype.str)) as pool:
+            tasks = [(numv, opt, engine, s) for s in seeds]
+            chunk = max(1, runs // (8 * (workers or os.cpu_count())))
+            run_data = np.empty(runs, dtype=int)
+
+            with RunLog(log, 1) as runlog:
+                for i, j in enumerate(pool.map(parallel_trials, tasks,
+                                               chunksize=chunk)):
+                    run_data[i] = j
+                    runlog.write(j)
+        del E
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return np.bincount(run_data)
+
+
+def attach_edges(name, shape, dtype):
+    """Worker initialiser: map the shared edge array once per process"""
+    global _shm, _edges
+
+    _shm = shared_memory.SharedMemory(name=name)
+    _edges = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+
+
+def parallel_trials(task):
+    """Worker task: count trials until optimum for a single run"""
+    numv, opt, engine, seed = task
+    np.random.seed(seed.generate_state(4))
+    trials = trial_cuts(numv, _edges, engine=engine)
+    cut = 0
+    j = 0
+
+    while cut != opt:
+        cut = next(trials)
+        j += 1
+
+    return j
+
+
+def time_run(numv, edges, engine='numpy', passes=1):
+    """Measure single pass performance (averaged over passes)"""
+    trials = trial_cuts(numv, edges, engine=engine, batch=passes)
     t = perf_counter()
-    cut = karger(numv, edges)
 
-    return perf_counter() - t, cut
+    for _ in range(passes):
+        cut = next(trials)
+
+    return (perf_counter() - t) / passes, cut
 
 
 ###############################################################################
 # Plotting
 
-def plot_run(*args, filename=None):
+def plot_run(*args, filename=None, points=10**5):
     """Plot cut alternation and convergence of solution"""
     if filename is None:
         cuts = args[0]
         bestcuts = args[1]
     else:
-        with open(filename, 'r') as infile:
-            line = infile.readline()[:-1].split(' ')
-            cuts = list(map(lambda x: int(x), line))
-            
-            line = infile.readline()[:-1].split(' ')
-            bestcuts = list(map(lambda x: int(x), line))
+        cuts, bestcuts = read_run(filename)
 
-    runs = [i for i in range(len(cuts))]
+    # Long runs are binned into at most points records (lowest cut per bin)
+    starts = np.arange(0, len(cuts), max(1, -(-len(cuts) // points)))
+    cuts = np.minimum.reduceat(np.asarray(cuts), starts) if len(cuts) else cuts
+    bestcuts = (np.minimum.reduceat(np.asarray(bestcuts), starts)
+                if len(bestcuts) else bestcuts)
+    runs = starts
 
     fig = plt.figure(figsize=(6.4, 4.8), dpi=150)
     ax = fig.gca()
@@ -158,30 +682,31 @@ def plot_run(*args, filename=None):
     plt.show()
 
 
-def histogram(*args, filename=None):
+def histogram(*args, filename=None, bins=1000):
     """Plot histogram from distribution data"""
     if filename is None:
-        distribution = args[0]
+        distribution = np.asarray(args[0])
     else:
-        with open(filename, 'r') as infile:
-            line = infile.readline()[:-1].split(' ')
-            distribution = list(map(lambda x: int(x), line))
+        distribution = read_distribution(filename)
 
-    run_data = []
-    total_runs = len(distribution)
+    # Work on the counts directly, values i occur distribution[i] times
+    values = np.arange(len(distribution))
+    total = distribution.sum()
 
-    for i in range(total_runs):
-        runs = distribution[i]
-        run_data += [i]*runs
-
-    sigma = np.std(list(map(lambda x: -x, run_data[1::-1])) + run_data)
+    # Half-normal fit: sigma of the distribution mirrored around zero
+    sigma = np.sqrt(np.dot(distribution, values**2.) / total)
     gauss = ((1/(np.sqrt(2*np.pi) * sigma)) *
-            np.exp(-0.5 * (1/sigma * np.array(run_data))**2)) * 2*len(run_data)
+            np.exp(-0.5 * (1/sigma * values)**2)) * 2*total
+
+    # At most bins bars, scaled to runs per unit of the x axis
+    edges = np.unique(np.linspace(0, len(distribution),
+                                  min(bins, len(distribution)) + 1).astype(int))
+    counts = np.add.reduceat(distribution, edges[:-1]) / np.diff(edges)
 
     fig = plt.figure(figsize=(6.4, 4.8), dpi=150)
     ax = fig.gca()
-    ax.hist(run_data, total_runs)
-    ax.plot(run_data, gauss)
+    ax.stairs(counts, edges - 0.5, fill=True)
+    ax.plot(values, gauss)
     ax.set_xlabel('Runs before optimum')
     ax.set_ylabel('Run density')
     ax.set_title('Run distribution')
@@ -192,19 +717,79 @@ def histogram(*args, filename=None):
 ###############################################################################
 # Auxiliary
 
-def read_graph(filename, dtype='uint16'):
-    """Read graph data in DIMACS format"""
+def read_graph(filename, dtype='uint16', cache=True, chunk=2**20):
+    """Read graph data in DIMACS format (cached as a memory-mapped sidecar)"""
+    stat = os.stat(filename)
+    key = '.%d-%d.%s.npy' % (stat.st_size, stat.st_mtime_ns, np.dtype(dtype))
+    cachefile = filename + key
+
+    if cache and os.path.exists(cachefile):
+        data = np.load(cachefile, mmap_mode='r')
+        return int(data[0,0]), data[1:]
+
+    numv, edges = parse_graph(filename, dtype=dtype, chunk=chunk)
+
+    # First row holds the vertex count, the rest are edges
+    data = np.empty([edges.shape[0]+1, 2], dtype=edges.dtype)
+    data[0] = (numv, 0)
+    data[1:] = edges
+
+    if cache:
+        try:
+            # Drop sidecars of older versions of the file (any dtype), other
+            # files next to the graph are left alone
+            stamp = '.%d-%d.' % (stat.st_size, stat.st_mtime_ns)
+
+            for oldfile in glob(glob_escape(filename) + '.*.npy'):
+                suffix = oldfile[len(filename):]
+
+                if (SIDECAR.fullmatch(suffix) and
+                        not suffix.startswith(stamp)):
+                    os.remove(oldfile)
+
+            # Write under a temporary name, so that concurrent readers never
+            # map a partially written sidecar
+            folder = os.path.dirname(cachefile) or '.'
+            fd, tmpfile = tempfile.mkstemp(suffix='.tmp', dir=folder)
+
+            try:
+                with os.fdopen(fd, 'wb') as outfile:
+                    np.save(outfile, data)
+
+                os.replace(tmpfile, cachefile)
+            except BaseException:
+                os.remove(tmpfile)
+                raise
+        except OSError:
+            pass
+
+    return numv, data[1:]
+
+
+def parse_graph(filename, dtype='uint16', chunk=2**20):
+    """Parse DIMACS edges in chunks (comment lines are skipped)"""
     with open(filename, 'r') as infile:
-        numv, nume = infile.readline()[:-1].split(' ')[2:]
-        numv, nume = (int(numv), int(nume))
+        for line in infile:
+            fields = line.split()
 
+            if fields and fields[0] == 'p':
+                numv, nume = int(fields[2]), int(fields[3])
+                break
+
+        # Widen the requested dtype if vertex labels would overflow it
+        dtype = np.promote_types(dtype, np.min_scalar_type(numv))
         edges = np.empty([nume, 2], dtype=dtype)
 
-        for edge in range(nume):
-            v1, v2 = infile.readline()[2:-1].split(' ')
-            v1, v2 = (int(v1), int(v2))
-            edges[edge] = np.array([v1, v2])
-    
+        # Comment lines do not count towards max_rows, which numpy warns about
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+
+            for i in range(0, nume, chunk):
+                rows = min(chunk, nume-i)
+                edges[i:i+rows] = np.loadtxt(infile, usecols=(1,2),
+                                             dtype=dtype, comments='c',
+                                             max_rows=rows, ndmin=2)
+
     return numv, edges
 
 
@@ -226,24 +811,139 @@ def mlog(distribution, filename='ka_mlog.txt'):
 
 
 def merge_mlogs(filenames, filename='ka_mlog.txt'):
-    """Combine separate distribution data"""
-    run_data = []
+    """Combine separate distribution data (text or streaming logs)"""
+    new_distribution = np.zeros(0, dtype=int)
 
     for datafile in filenames:
-        with open(datafile, 'r') as infile:
-            line = infile.readline()[:-1].split(' ')
-            run_data.append(list(map(lambda x: int(x), line)))
+        new_distribution = add_distributions(new_distribution,
+                                             read_distribution(datafile))
 
-    maxlen = max([len(distribution) for distribution in run_data])
-    distributions = np.array([rd + [0]*(maxlen-len(rd)) for rd in run_data])
-    
-    new_distribution = np.sum(distributions, axis=0)
     new_data = ' '.join(list(map(lambda x: str(x), new_distribution))) + '\n'
     
     with open(filename, 'w') as outfile:
         outfile.write(new_data)
 
 
+class RunLog:
+    """Append-only binary log of int32 records with periodic flushes"""
+
+    def __init__(self, filename, width, interval=1.):
+        self.file = None
+        self.resumed = 0
+        self.width = width
+        self.interval = interval
+        self.fmt = '<%di' % width
+
+        if filename is None:
+            return
+
+        if os.path.exists(filename) and os.path.getsize(filename):
+            # Resume: check the header and drop a partially written record
+            if log_width(filename) != width:
+                raise ValueError('Log record width mismatch: ' + filename)
+
+            size = os.path.getsize(filename)
+            size -= (size - LOG_HEAD) % (4*width)
+            self.file = open(filename, 'r+b')
+            self.file.truncate(size)
+            self.file.seek(size)
+            self.resumed = (size - LOG_HEAD) // (4*width)
+        else:
+            self.file = open(filename, 'wb')
+            self.file.write(LOG_MAGIC + struct.pack('<I', width))
+
+        self.last = perf_counter()
+
+    def write(self, *values):
+        if self.file is None:
+            return
+
+        self.file.write(struct.pack(self.fmt, *values))
+
+        if perf_counter() - self.last > self.interval:
+            self.file.flush()
+            self.last = perf_counter()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def log_width(filename):
+    """Record width of a streaming log, or None for text logs"""
+    with open(filename, 'rb') as infile:
+        head = infile.read(LOG_HEAD)
+
+    if len(head) < LOG_HEAD or head[:4] != LOG_MAGIC:
+        return None
+
+    return struct.unpack('<I', head[4:])[0]
+
+
+def read_log(filename):
+    """Lazily map the complete records of a streaming log"""
+    width = log_width(filename)
+    numr = (os.path.getsize(filename) - LOG_HEAD) // (4*width)
+
+    if not numr:
+        return np.empty([0, width], dtype='<i4')
+
+    return np.memmap(filename, dtype='<i4', mode='r', offset=LOG_HEAD,
+                     shape=(numr, width))
+
+
+def read_run(filename):
+    """Read typical run data (text or streaming log)"""
+    if log_width(filename) is not None:
+        R = read_log(filename)
+        return R[:,0], R[:,1]
+
+    with open(filename, 'r') as infile:
+        line = infile.readline()[:-1].split(' ')
+        cuts = list(map(lambda x: int(x), line))
+
+        line = infile.readline()[:-1].split(' ')
+        bestcuts = list(map(lambda x: int(x), line))
+
+    return cuts, bestcuts
+
+
+def read_distribution(filename, chunk=2**24):
+    """Read distribution data, aggregating streaming logs in chunks"""
+    if log_width(filename) is None:
+        with open(filename, 'r') as infile:
+            line = infile.readline()[:-1].split(' ')
+
+        return np.array(list(map(lambda x: int(x), line)))
+
+    R = read_log(filename)
+    distribution = np.zeros(0, dtype=int)
+
+    for i in range(0, R.shape[0], chunk):
+        distribution = add_distributions(distribution,
+                                         np.bincount(R[i:i+chunk,0]))
+
+    return distribution
+
+
+def add_distributions(a, b):
+    """Sum two distributions of possibly different lengths"""
+    if len(a) < len(b):
+        a, b = b, a
+
+    a = a.copy()
+    a[:len(b)] += b
+
+    return a
+
+
 #############################################################################
 # CLI
 
@@ -254,11 +954,11 @@ if __name__ == '__main__':
         datafile = sys.argv[2]
         numv, edges = read_graph(datafile)
         opt = int(sys.argv[3])
-        cuts, bestcuts = single_run(numv, edges, opt)
-        
+
         if len(sys.argv) > 4:
-            tlog(cuts, bestcuts, filename=sys.argv[4])
+            single_run(numv, edges, opt, log=sys.argv[4])
         else:
+            cuts, bestcuts = single_run(numv, edges, opt)
             plot_run(cuts, bestcuts)
     
     elif mode == 'plot':
@@ -270,13 +970,40 @@ if __name__ == '__main__':
         numv, edges = read_graph(datafile)
         opt = int(sys.argv[3])
         runs = int(sys.argv[4])
-        distribution = multi_run(numv, edges, opt, runs)
 
         if len(sys.argv) > 5:
-            mlog(distribution, filename=sys.argv[5])
+            multi_run(numv, edges, opt, runs, log=sys.argv[5])
         else:
+            distribution = multi_run(numv, edges, opt, runs)
             histogram(distribution)
     
+    elif mode == 'stein':
+        datafile = sys.argv[2]
+        numv, edges = read_graph(datafile)
+        opt = int(sys.argv[3])
+        runs = int(sys.argv[4])
+        log = sys.argv[5] if len(sys.argv) > 5 else None
+        t = perf_counter()
+        distribution = multi_run(numv, edges, opt, runs, engine='stein',
+                                 log=log)
+        print(perf_counter() - t)
+
+        if log is None:
+            histogram(distribution)
+
+    elif mode == 'pmulti':
+        datafile = sys.argv[2]
+        numv, edges = read_graph(datafile)
+        opt = int(sys.argv[3])
+        runs = int(sys.argv[4])
+        workers = int(sys.argv[5])
+        log = sys.argv[6] if len(sys.argv) > 6 else None
+        distribution = multi_run_parallel(numv, edges, opt, runs,
+                                          workers=workers, log=log)
+
+        if log is None:
+            histogram(distribution)
+
     elif mode == 'merge':
         datafile = sys.argv[2]
         datafiles = sys.argv[3:]
@@ -289,13 +1016,15 @@ if __name__ == '__main__':
     elif mode == 'time':
         datafile = sys.argv[2]
         numv, edges = read_graph(datafile)
-        dt, _ = time_run(numv, edges)
+        engine = sys.argv[3] if len(sys.argv) > 3 else 'numpy'
+        dt, _ = time_run(numv, edges, engine=engine)
         print(dt)
     
     elif mode == 'cut':
         datafile = sys.argv[2]
         numv, edges = read_graph(datafile)
-        a, b = cut_groups(numv, edges)
+        engine = sys.argv[3] if len(sys.argv) > 3 else 'numpy'
+        a, b = cut_groups(numv, edges, engine=engine)
         print(a)
         print(b)
     
@@ -303,9 +1032,18 @@ if __name__ == '__main__':
         datafile = sys.argv[2]
         opt = int(sys.argv[3])
         numv, edges = read_graph(datafile)
-        a, b = mincut_groups(numv, edges, opt)
+        engine = sys.argv[4] if len(sys.argv) > 4 else 'numpy'
+        a, b = mincut_groups(numv, edges, opt, engine=engine)
         print(a)
         print(b)
     
+    elif mode == 'exact':
+        datafile = sys.argv[2]
+        numv, edges = read_graph(datafile)
+        cut, a, b = stoer_wagner(numv, edges)
+        print(cut)
+        print(a)
+        print(b)
+
     else:
         print("Mode '" + mode + "' not implemented.")
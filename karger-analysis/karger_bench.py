@@ -0,0 +1,156 @@
+"""Karger benchmark suite (time to target per contraction engine)"""
+
+import os
+import sys
+import csv
+import json
+import tracemalloc
+import numpy as np
+from time import perf_counter
+
+import karger_analysis as kga
+
+
+# Graph sizes as (vertices, edges, planted cut)
+SUITE = [(50, 400, 3), (100, 1500, 5), (200, 3000, 8), (400, 8000, 10)]
+# Karger-Stein ('stein') is slow on the larger sizes and has to be requested
+ENGINES = ['numpy', 'uf', 'batch']
+
+
+###############################################################################
+# Graphs
+
+def random_graph(numv, nume, rng=np.random):
+    """Random connected multigraph: a spanning cycle plus random edges"""
+    V = np.arange(1, numv+1)
+    cycle = np.column_stack((V, np.roll(V, -1)))
+    E = rng.randint(1, numv+1, size=[nume-numv, 2])
+    E = E[E[:,0] != E[:,1]]
+
+    return numv, np.vstack((cycle, E)).astype(read_dtype(numv))
+
+
+def planted_graph(numv, nume, cut, rng=np.random):
+    """Two random halves joined by exactly cut edges"""
+    half = numv // 2
+    _, A = random_graph(half, (nume - cut) // 2, rng=rng)
+    _, B = random_graph(numv - half, nume - cut - A.shape[0], rng=rng)
+
+    C = np.column_stack((rng.randint(1, half+1, size=cut),
+                         rng.randint(half+1, numv+1, size=cut)))
+    B = B.astype(int) + half
+
+    return numv, np.vstack((A, B, C)).astype(read_dtype(numv))
+
+
+def read_dtype(numv):
+    """Same dtype as would be chosen by kga.read_graph"""
+    return np.promote_types('uint16', np.min_scalar_type(numv))
+
+
+###############################################################################
+# Measurements
+
+def bench_engine(numv, edges, opt, engine, runs=20, passes=20):
+    """Measure per-pass latency and time/trials to optimum for one engine"""
+    trials = kga.trial_cuts(numv, edges, engine=engine, batch=passes)
+    t = perf_counter()
+
+    for _ in range(passes):
+        next(trials)
+
+    latency = (perf_counter() - t) / passes
+
+    run_trials = np.empty(runs, dtype=int)
+    run_times = np.empty(runs)
+
+    for i in range(runs):
+        t = perf_counter()
+        cut = 0
+        j = 0
+
+        while cut != opt:
+            cut = next(trials)
+            j += 1
+
+        run_times[i] = perf_counter() - t
+        run_trials[i] = j
+
+    # Batched trials are computed ahead, so their time is amortised per pass
+    if engine == 'batch':
+        run_times = run_trials * latency
+
+    # Peak memory of the same passes, traced separately so timings stay clean
+    tracemalloc.start()
+    trials = kga.trial_cuts(numv, edges, engine=engine, batch=passes)
+
+    for _ in range(passes):
+        next(trials)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(run_times, [50, 90, 99])
+
+    return {'engine': engine,
+            'pass_latency': latency,
+            'trials_mean': float(run_trials.mean()),
+            'trials_max': int(run_trials.max()),
+            'tto_p50': float(p50),
+            'tto_p90': float(p90),
+            'tto_p99': float(p99),
+            'peak_memory': peak}
+
+
+def bench_suite(suite=SUITE, engines=ENGINES, runs=20, passes=20, seed=0):
+    """Run every engine on random and planted-cut graphs of each size"""
+    np.random.seed(seed)
+    results = []
+
+    for numv, nume, cut in suite:
+        graphs = [('random', cut, random_graph(numv, nume)),
+                  ('planted', cut, planted_graph(numv, nume, cut))]
+
+        for kind, planted, (numv, edges) in graphs:
+            opt, _, _ = kga.stoer_wagner(numv, edges)
+
+            for engine in engines:
+                row = {'graph': kind,
+                       'vertices': numv,
+                       'edges': edges.shape[0],
+                       'planted_cut': planted if kind == 'planted' else None,
+                       'mincut': opt}
+                row.update(bench_engine(numv, edges, opt, engine,
+                                        runs=runs, passes=passes))
+                results.append(row)
+                print(kind, numv, edges.shape[0], engine,
+                      row['pass_latency'], row['tto_p50'])
+
+    return results
+
+
+###############################################################################
+# Output
+
+def write_results(results, filename):
+    """Write results as JSON or CSV (by file extension)"""
+    if os.path.splitext(filename)[1] == '.csv':
+        with open(filename, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(filename, 'w') as outfile:
+            json.dump(results, outfile, indent=1)
+
+
+#############################################################################
+# CLI
+
+if __name__ == '__main__':
+    filename = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    engines = sys.argv[3].split(',') if len(sys.argv) > 3 else ENGINES
+
+    results = bench_suite(engines=engines, runs=runs)
+    write_results(results, filename)
@@ -0,0 +1,217 @@
+"""Persistent homology of Vietoris-Rips filtrations over Z/2."""
+
+##############################################################################################
+# MODULES
+
+import numpy as np
+from time import perf_counter
+
+from rips import filtration
+
+
+##############################################################################################
+# MAIN
+
+def persistence(F, max_dim=1):
+    """Returns persistence diagrams of a filtration F (from rips.filtration) up to max_dim.
+
+    Diagrams are {dim: array of (birth, death)}, with death np.inf for classes that survive
+    the whole filtration. F has to contain simplices up to dimension max_dim+1. Pairs of zero
+    persistence are left out."""
+
+    D = {}
+
+    if 0 not in F:
+        return D
+
+    # H0 by union-find, merging edges are cleared from the H1 reduction
+    pairs, essential, cleared = components(F)
+    D[0] = diagram(F, 0, pairs, essential)
+
+    # Higher dimensions by reducing coboundary matrices (cohomology with clearing)
+    for i in range(1, max_dim+1):
+        if i not in F:
+            D[i] = np.empty((0,2))
+            continue
+
+        pairs, essential, cleared = reduce_coboundary(F, i, cleared)
+        D[i] = diagram(F, i, pairs, essential)
+
+    return D
+
+
+def rips_persistence(S, epsilon, max_dim=1):
+    """Returns persistence diagrams of the VR filtration of points S up to radius epsilon."""
+
+    return persistence(filtration(S, epsilon, max_dim+1), max_dim)
+
+
+##############################################################################################
+# AUXILIARY
+
+def components(F):
+    """Pairs vertices with the edges that merge their components (elder rule)."""
+
+    n = len(F[0][0])
+    parent = list(range(n))
+    pairs = []
+    cleared = set()
+
+    E = F[1][0].tolist() if 1 in F else []
+
+    for e, (u, v) in enumerate(E):
+        # Find roots with path halving, the root is the oldest vertex of a component
+        while parent[u] != u:
+            parent[u] = parent[parent[u]]
+            u = parent[u]
+
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+
+        if u != v:
+            u, v = min(u, v), max(u, v)
+            parent[v] = u
+            pairs.append((v, e))
+            cleared.add(e)
+
+    essential = [v for v in range(n) if parent[v] == v]
+
+    return pairs, essential, cleared
+
+
+def reduce_coboundary(F, i, cleared):
+    """Reduces the coboundary matrix of i-simplices, skipping cleared columns.
+
+    Columns are processed in reverse filtration order and the pivot of a column is its earliest
+    coface. Returns persistence pairs (simplex, coface), essential simplices and the cofaces
+    used as pivots (which clear the next dimension)."""
+
+    m = len(F[i][0])
+
+    if i+1 not in F:
+        return [], [s for s in range(m) if s not in cleared], set()
+
+    start, rows = coboundary(F, i)
+    start = start.tolist()
+    rows = rows.tolist()
+
+    owner = {}
+    reduced = {}
+    pairs = []
+    essential = []
+
+    for s in range(m-1, -1, -1):
+        if s in cleared:
+            continue
+
+        col = rows[start[s]:start[s+1]]
+        p = min(col) if col else -1
+
+        # Apparent pair, no reduction needed
+        if p != -1 and p not in owner:
+            owner[p] = s
+            reduced[s] = col
+            pairs.append((s, p))
+            continue
+
+        col = set(col)
+
+        while col:
+            p = min(col)
+
+            if p not in owner:
+                break
+
+            col.symmetric_difference_update(reduced[owner[p]])
+
+        if col:
+            owner[p] = s
+            reduced[s] = col
+            pairs.append((s, p))
+        else:
+            essential.append(s)
+
+    return pairs, essential, set(owner)
+
+
+def coboundary(F, i):
+    """Cofaces of i-simplices (positions in F[i+1]) in compressed sparse column form."""
+
+    K = F[i][0]
+    L = F[i+1][0]
+    n = len(F[0][0])
+
+    if float(n) ** (i+1) >= 2**63:
+        raise ValueError('Too many vertices to encode simplices of dimension %d' % i)
+
+    # Positions of faces by their keys in base n
+    keys = encode(K, n)
+    order = np.argsort(keys)
+    keys = keys[order]
+
+    cols = []
+
+    for j in range(i+2):
+        cols.append(order[np.searchsorted(keys, encode(np.delete(L, j, axis=1), n))])
+
+    cols = np.concatenate(cols)
+    rows = np.tile(np.arange(len(L)), i+2)
+
+    o = np.lexsort((rows, cols))
+    start = np.searchsorted(cols[o], np.arange(len(K)+1))
+
+    return start, rows[o]
+
+
+def encode(K, n):
+    """Integer keys of simplices (rows of K) in base n."""
+
+    keys = np.zeros(len(K), dtype=np.int64)
+
+    for j in range(K.shape[1]):
+        keys = keys*n + K[:,j]
+
+    return keys
+
+
+def diagram(F, i, pairs, essential):
+    """Birth and death radii of pairs and essential classes, sorted."""
+
+    B = F[i][1]
+
+    if pairs:
+        s, t = np.array(pairs).T
+        P = np.column_stack((B[s], F[i+1][1][t]))
+        P = P[P[:,0] < P[:,1]]
+    else:
+        P = np.empty((0,2))
+
+    P = np.vstack((P, np.column_stack((B[essential], np.full(len(essential), np.inf)))))
+
+    return P[np.lexsort((P[:,1], P[:,0]))]
+
+
+##############################################################################################
+# Test
+
+if __name__ == '__main__':
+
+    # Square (example 5 in rips.py) has a hole between radii sqrt(2) and 2
+    S = [(-1,0),(0,-1),(1,0),(0,1)]
+    print(rips_persistence(S,3),'\n')
+    # Prints out:
+    # {0: array([[0.        , 1.41421356],
+    #        [0.        , 1.41421356],
+    #        [0.        , 1.41421356],
+    #        [0.        ,        inf]]), 1: array([[1.41421356, 2.        ]])}
+
+    # Noisy circle of many points
+    t = np.random.rand(2*10**4) * 2*np.pi
+    r = 1 + np.random.normal(scale=0.05, size=2*10**4)
+    S = np.column_stack((r*np.cos(t), r*np.sin(t)))
+
+    ctr = perf_counter()
+    D = rips_persistence(S,0.02)  # ~ 5 sec
+    print(perf_counter() - ctr)
+    print({i: len(P) for i, P in D.items()})
@@ -4,87 +4,444 @@
 # MODULES
 
 import numpy as np
+from itertools import combinations, product
+from heapq import heapify, heappush, heappop
+from concurrent.futures import ProcessPoolExecutor
 from time import perf_counter
 
 
 ##############################################################################################
 # MAIN
 
-def cliques(VG, EG):
-    """Finds all cliques in a graph, given as lists of vertices and edges."""
+def cliques(VG, EG, max_dim=None, workers=None):
+    """Finds all cliques in a graph, given as lists of vertices and edges (up to degree max_dim).
     
-    # Redefine graph as a hash-map of neighbours
-    G = {}
+    With workers (and no max_dim), the search is split over a pool of processes."""
+    
+    index = {v: i for i, v in enumerate(VG)}
+    
+    # Capped degree: expand edges into higher cliques incrementally
+    if max_dim is not None:
+        EG = np.array([(index[e[0]], index[e[1]]) for e in EG], dtype=np.int64)
+        C = {i: list(map(tuple, K.tolist())) for i, K in skeleton(len(VG), EG, max_dim).items()}
+    
+    else:
+        # Redefine graph as neighbour bitsets over the positions of vertices in VG
+        N = [0] * len(VG)
+        
+        for e in EG:
+            i, j = index[e[0]], index[e[1]]
+            
+            if i != j:
+                N[i] |= 1 << j
+                N[j] |= 1 << i
+        
+        # Call pivoting Bron-Kerbosch once for cliques of all degrees (or per seed in parallel)
+        C = {}
+        
+        if workers:
+            C = parallel_cliques(N, workers)
+        else:
+            bronkerbosch([], [], (1 << len(VG)) - 1, N, C)
+        
+        for i in C:
+            C[i].sort()
+    
+    # Same (lexicographic) order as before, in terms of the original vertices
+    if VG != list(range(len(VG))):
+        for i in C:
+            C[i] = [tuple(VG[v] for v in c) for c in C[i]]
+    
+    return dict(sorted(C.items()))
+
 
-    for v in VG:
-        G[v] = []
+def VR(S, epsilon, max_dim=None, workers=None, approx=None):
+    """Returns the simplices in the Vietoris-Rips complex in their corresponding dimension (up to max_dim).
     
-    for e in EG:
-        G[e[0]].append(e[1])
-        G[e[1]].append(e[0])
+    With approx, the complex is built on maxmin landmarks only, chosen so that every point is
+    within approx*epsilon of a landmark. Its persistence at radii around epsilon is then within
+    2*approx*epsilon of that of the full complex. Simplices are given by original point indices."""
     
-    # Call modified Bron-Kerbosch algorithm for all possible degrees of cliques
-    C = {}
+    # Restrict to landmarks (in increasing order, so that the simplices stay sorted)
+    if approx is not None:
+        L = landmarks(S, approx*epsilon)
+        C = VR([S[i] for i in L], epsilon, max_dim, workers)
+        
+        return {i: [tuple(L[v] for v in c) for c in C[i]] for i in C}
+    
+    # Find valid edges between pairs of vertices
+    EG = epsilon_graph(S, epsilon)
+    
+    # Get associated cliques
+    if max_dim is None:
+        return cliques(list(range(len(S))),EG.tolist(),workers=workers)
+    
+    return {i: list(map(tuple, K.tolist())) for i, K in skeleton(len(S), EG, max_dim).items()}
 
-    for i in range(len(VG)):
-        Ci = bronkerbosch([],VG,[],G,i)
+
+def landmarks(S, radius):
+    """Returns indices of maxmin landmarks (sorted), such that every point is within radius of one.
+    
+    Every next landmark is the point furthest from those chosen so far (greedy permutation)."""
+    
+    n = len(S)
+    
+    if not n:
+        return []
+    
+    # Points sorted by the first coordinate, a new landmark can only get closer to those
+    # within the current maximum distance in that coordinate
+    X = np.array(S, dtype=float).reshape(n,-1)
+    order = np.argsort(X[:,0], kind='stable')
+    X = X[order]
+    
+    i = int(np.flatnonzero(order == 0)[0])
+    L = [i]
+    D = np.linalg.norm(X - X[i], axis=-1)
+    
+    while True:
+        i = int(np.argmax(D))
+        
+        if D[i] <= radius:
+            break
         
-        if Ci:
-            C[i] = Ci
+        L.append(i)
+        a = np.searchsorted(X[:,0], X[i,0] - D[i], 'left')
+        b = np.searchsorted(X[:,0], X[i,0] + D[i], 'right')
+        D[a:b] = np.minimum(D[a:b], np.linalg.norm(X[a:b] - X[i], axis=-1))
+    
+    return sorted(order[L].tolist())
+
+
+def parallel_cliques(N, workers):
+    """Finds all cliques of a graph with neighbour bitsets N on a pool of processes.
+    
+    Every connected component is ordered by degeneracy (smallest last). A seed vertex gets the
+    cliques in which it comes first, i.e. the cliques among its later neighbours extended by
+    the seed, so seeds are independent and are sent to workers in batches."""
+    
+    size = max(1, len(N) // (4*workers))
+    components = []
+    tasks = [[]]
+    count = 0
+    
+    for comp in connected_components(N):
+        # Relabel the component in degeneracy order, later neighbours are then higher bits
+        order = degeneracy(N, comp)
+        local = {v: i for i, v in enumerate(order)}
+        M = [sum(1 << local[u] for u in bits(N[v])) for v in order]
+        components.append((M, order))
+        
+        for a in range(0, len(order), size):
+            tasks[-1].append((len(components)-1, a, min(a+size, len(order))))
+            count += min(size, len(order)-a)
+            
+            # Small components are batched together
+            if count >= size:
+                tasks.append([])
+                count = 0
+    
+    C = {}
+    
+    # Components are sent once per worker, tasks only refer to them
+    with ProcessPoolExecutor(workers, initializer=attach_components,
+                             initargs=(components,)) as pool:
+        for Ct in pool.map(seed_cliques, tasks):
+            for i in Ct:
+                C.setdefault(i, []).extend(map(tuple, Ct[i].tolist()))
     
     return C
 
 
-def VR(S, epsilon):
-    """Returns the simplices in the Vietoris-Rips complex in their corresponding dimension."""
+def skeleton(n, EG, max_dim, block=2**22):
+    """Returns the max_dim-skeleton of the clique complex on vertices 0..n-1 as integer arrays.
+    
+    Simplices of dimension i are the rows of an (m, i+1) array, sorted within and across rows.
+    Every simplex is a simplex of one dimension lower plus a new largest vertex, which has to
+    be a lower neighbour of all of its vertices (Zomorodian's incremental expansion)."""
+    
+    dtype = np.int32 if n < 2**31 else np.int64
+    
+    # Edges (i,j), i < j, without loops and duplicates, in lexicographic order
+    E = np.sort(np.asarray(EG, dtype=np.int64).reshape(-1,2), axis=1)
+    E = np.unique(E[E[:,0] != E[:,1]], axis=0)
+    keys = E[:,0]*n + E[:,1]
+    
+    # Upper neighbours of vertex v are E[start[v]:start[v+1],1]
+    start = np.searchsorted(E[:,0], np.arange(n+1))
+    
+    K = {0: np.arange(n, dtype=dtype)[:,None], 1: E.astype(dtype)}
+    K = {i: K[i] for i in K if i <= max_dim and len(K[i])}
+    
+    for i in range(2, max_dim+1):
+        if i-1 not in K:
+            break
+        
+        T = K[i-1]
+        last = T[:,-1]
+        counts = start[last+1] - start[last]
+        ends = np.cumsum(counts)
+        cuts = np.searchsorted(ends, np.arange(block, ends[-1], block))
+        Ki = []
+        
+        # Candidates are upper neighbours of the last vertex, a block at a time
+        for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(T)]):
+            rows = np.repeat(np.arange(a, b), counts[a:b])
+            offset = np.repeat(start[last[a:b]] - ends[a:b] + counts[a:b], counts[a:b])
+            W = E[offset + np.arange(len(rows)) + (ends[a-1] if a else 0), 1]
+            ok = np.ones(len(rows), dtype=bool)
+            
+            # Keep those adjacent to all other vertices
+            for j in range(i-1):
+                ok &= has_edge(keys, T[rows,j].astype(np.int64)*n + W)
+            
+            Ki.append(np.column_stack((T[rows[ok]], W[ok].astype(dtype))))
+        
+        Ki = np.vstack(Ki)
+        
+        if len(Ki):
+            K[i] = Ki
     
-    # Redefine points as a hash-map of vertices
-    V = {}
+    return K
+
 
-    for i in range(len(S)):
-        V[i] = np.array(S[i])
+def filtration(S, epsilon, max_dim=2):
+    """Returns the filtered VR complex up to epsilon, as {dim: (simplices, birth radii)}.
     
-    # Find valid edges between pairs of vertices
-    EG = []
+    Every simplex is born at the length of its longest edge. Simplices of each dimension are
+    sorted by birth (ties in lexicographic order), so complexes at smaller radii are prefixes."""
+    
+    n = len(S)
+    
+    if not n:
+        return {}
+    
+    X = np.array(S, dtype=float).reshape(n,-1)
+    EG = epsilon_graph(S, epsilon)
+    
+    # Same distances as those compared to epsilon in epsilon_graph
+    D = np.linalg.norm(X[EG[:,0]] - X[EG[:,1]], axis=-1)
+    keys = EG[:,0].astype(np.int64)*n + EG[:,1]
+    F = {}
+    
+    for i, K in skeleton(n, EG, max_dim).items():
+        B = np.zeros(len(K))
+        
+        for a, b in combinations(range(i+1), 2):
+            B = np.maximum(B, D[np.searchsorted(keys, K[:,a].astype(np.int64)*n + K[:,b])])
+        
+        order = np.argsort(B, kind='stable')
+        F[i] = (K[order], B[order])
+    
+    return F
+
 
-    for i in range(len(S)-1):
-        for j in range(i+1,len(S)):
-            if np.linalg.norm(V[i] - V[j]) <= epsilon:
-                EG.append((i,j))
+def complex_at(F, epsilon):
+    """Returns the simplices of a filtration F born by epsilon, as {dim: simplices}."""
     
-    # Get associated cliques
-    return cliques(sorted(V.keys()),EG)
+    C = {}
+    
+    for i, (K, B) in F.items():
+        m = np.searchsorted(B, epsilon, 'right')
+        
+        if m:
+            C[i] = K[:m]
+    
+    return C
+
+
+def epsilon_graph(S, epsilon, block=2**22):
+    """Returns edges (i,j), i < j, between points at most epsilon apart, in lexicographic order."""
+    
+    n = len(S)
+    
+    if n < 2:
+        return np.empty((0,2), dtype=int)
+    
+    X = np.array(S, dtype=float).reshape(n,-1)
+    d = X.shape[1]
+    
+    # Hash points into a grid of epsilon-sized cells (padded, so that neighbouring cells exist)
+    if epsilon > 0 and d <= 3:
+        G = np.floor((X - X.min(0)) / epsilon).astype(np.int64) + 1
+        shape = G.max(0) + 2
+        
+        if np.prod(shape.astype(float)) < 2**62:
+            return grid_pairs(X, epsilon, G, shape, block)
+    
+    # Otherwise compare blocks of rows against all points, with bounded memory
+    EG = []
+    rows = max(1, block // (n*d))
+    
+    for a in range(0, n-1, rows):
+        D = np.linalg.norm(X[a:a+rows,None,:] - X[None,a:,:], axis=-1)
+        I, J = np.nonzero(D <= epsilon)
+        keep = I < J
+        EG.append(np.column_stack((I[keep] + a, J[keep] + a)))
+    
+    return np.vstack(EG)
 
 
 ##############################################################################################
 # AUXILIARY
 
-def bronkerbosch(R,P_,X_,G,s):
-    """Meant to find maximal cliques in a graph. Modified to find cliques of specific degree."""
+def bronkerbosch(H, Q, P, N, C):
+    """Bron-Kerbosch with Tomita pivoting, modified to find all cliques (not only maximal ones).
     
-    # Found clique of degree s
-    if len(R)-1 == s:
-        return [tuple(R)]
+    Candidates P and neighbourhoods N are bitsets. Every branch holds the vertices in H and
+    may add any subset of the pivots in Q, so each clique is found exactly once (Jain and
+    Seshadhri's succinct clique tree). Cliques are sorted tuples, stored into C by degree."""
     
-    # Found maximal clique, but not of degree s
-    elif not P_ and not X_:
-        return []
+    # Leaf: every subset of pivots completes the held vertices to a clique
+    if not P:
+        Q = sorted(Q)
+        
+        for k in range(not H, len(Q)+1):
+            Ck = C.setdefault(len(H)+k-1, [])
+            
+            if H:
+                Ck.extend(tuple(sorted(H + list(T))) for T in combinations(Q, k))
+            else:
+                Ck.extend(combinations(Q, k))
+        
+        return
     
-    # Recursive step
-    else:
-        Cs = []
-        P = P_.copy()
-        X = X_.copy()
+    # Pivot on the candidate with the most neighbours among candidates
+    u = max(bits(P), key=lambda v: (P & N[v]).bit_count())
+    bronkerbosch(H, Q + [u], P & N[u], N, C)
+    P &= ~(1 << u)
+    
+    # Branch on the remaining non-neighbours of the pivot
+    for v in bits(P & ~N[u]):
+        bronkerbosch(H + [v], Q, P & N[v], N, C)
+        P &= ~(1 << v)
+
+
+def has_edge(keys, K):
+    """Whether edge keys K (i*n + j) are among the sorted keys."""
+    
+    pos = np.searchsorted(keys, K)
+    ok = pos < len(keys)
+    ok[ok] = keys[pos[ok]] == K[ok]
+    
+    return ok
+
+
+def grid_pairs(X, epsilon, G, shape, block):
+    """Edges of the epsilon-graph, with candidates taken from neighbouring grid cells G."""
+    
+    # Points sorted by the key of their cell
+    keys = np.ravel_multi_index(G.T, shape)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    EG = []
+    
+    for o in product((-1,0,1), repeat=X.shape[1]):
+        K = np.ravel_multi_index((G + o).T, shape)
+        lo = np.searchsorted(keys, K, 'left')
+        counts = np.searchsorted(keys, K, 'right') - lo
+        
+        # Candidate pairs of roughly block entries at a time
+        ends = np.cumsum(counts)
+        cuts = np.searchsorted(ends, np.arange(block, ends[-1], block))
+        
+        for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(X)]):
+            I = np.repeat(np.arange(a, b), counts[a:b])
+            start = np.repeat(lo[a:b] - ends[a:b] + counts[a:b], counts[a:b])
+            J = order[start + np.arange(len(I)) + (ends[a-1] if a else 0)]
+            
+            keep = I < J
+            I, J = I[keep], J[keep]
+            keep = np.linalg.norm(X[I] - X[J], axis=-1) <= epsilon
+            EG.append(np.column_stack((I[keep], J[keep])))
+    
+    EG = np.vstack(EG)
+    
+    return EG[np.lexsort((EG[:,1], EG[:,0]))]
+
+
+def attach_components(components):
+    """Worker initialiser: keep the relabelled components (bitsets, order) once per process."""
+    
+    global _components
+    
+    _components = components
+
+
+def seed_cliques(task):
+    """Cliques of the seeds in a task, as arrays of the original vertex positions (sorted rows)."""
+    
+    C = {}
+    
+    for c, a, b in task:
+        M, order = _components[c]
+        Cs = {}
+        
+        for s in range(a, b):
+            bronkerbosch([s], [], M[s] & ~((1 << (s+1)) - 1), M, Cs)
+        
+        # Back to the original positions (sorted within cliques)
+        order = np.array(order)
+        
+        for i in Cs:
+            C.setdefault(i, []).append(np.sort(order[np.array(Cs[i]).reshape(-1, i+1)], axis=1))
+    
+    return {i: np.vstack(C[i]) for i in C}
+
 
-        for v in P_:
-            Cs += bronkerbosch(R+[v],
-                               [p for p in P if p in G[v]],
-                               [x for x in X if x in G[v]],
-                               G,s)
-            P.remove(v)
-            X.append(v)
+def connected_components(N):
+    """Vertex positions of each connected component of a graph with neighbour bitsets N."""
+    
+    left = (1 << len(N)) - 1
+    
+    while left:
+        comp = frontier = left & -left
+        
+        while frontier:
+            reach = 0
+            
+            for v in bits(frontier):
+                reach |= N[v]
+            
+            frontier = reach & ~comp
+            comp |= frontier
+        
+        left &= ~comp
+        yield list(bits(comp))
+
+
+def degeneracy(N, comp):
+    """Degeneracy (smallest last) order of the vertices of a component."""
+    
+    degree = {v: N[v].bit_count() for v in comp}
+    heap = [(d, v) for v, d in degree.items()]
+    heapify(heap)
+    order = []
+    left = sum(1 << v for v in comp)
+    
+    while heap:
+        d, v = heappop(heap)
+        
+        if not left >> v & 1 or d != degree[v]:
+            continue
+        
+        order.append(v)
+        left &= ~(1 << v)
         
-        return Cs
+        for u in bits(N[v] & left):
+            degree[u] -= 1
+            heappush(heap, (degree[u], u))
+    
+    return order
+
+
+def bits(B):
+    """Positions of set bits in an integer bitset, in increasing order."""
+    
+    while B:
+        low = B & -B
+        yield low.bit_length() - 1
+        B ^= low
 
 
 ##############################################################################################
@@ -141,10 +498,35 @@ if __name__ == '__main__':
     # Prints out:
     # {0: [(0,), (1,), (2,), (3,), (4,), (5,), (6,), (7,)], 1: [(0, 1), (0, 5), (1, 2), (1, 6), (2, 3), (2, 6), (2, 7), (3, 4), (3, 6), (3, 7), (4, 5), (4, 7), (6, 7)], 2: [(1, 2, 6), (2, 3, 6), (2, 3, 7), (2, 6, 7), (3, 4, 7), (3, 6, 7)], 3: [(2, 3, 6, 7)]}
 
+    # Example 7 (VR, at most triangles)
+    print(VR(S,epsilon,max_dim=2),'\n')
+    # Prints out:
+    # {0: [(0,), (1,), (2,), (3,), (4,), (5,), (6,), (7,)], 1: [(0, 1), (0, 5), (1, 2), (1, 6), (2, 3), (2, 6), (2, 7), (3, 4), (3, 6), (3, 7), (4, 5), (4, 7), (6, 7)], 2: [(1, 2, 6), (2, 3, 6), (2, 3, 7), (2, 6, 7), (3, 4, 7), (3, 6, 7)]}
+
+    # Example 8 (filtration, complexes of example 6 at smaller radii)
+    F = filtration(S,epsilon)
+
+    for r in (1,2,epsilon):
+        print(r,{i: K.tolist() for i, K in complex_at(F,r).items()})
+    print()
+    # Prints out:
+    # 1 {0: [[0], [1], [2], [3], [4], [5], [6], [7]]}
+    # 2 {0: [[0], [1], [2], [3], [4], [5], [6], [7]], 1: [[1, 6], [4, 7], [0, 5], [2, 3], [2, 6], [3, 7], [6, 7]]}
+    # 2.8284271247461903 {0: [[0], [1], [2], [3], [4], [5], [6], [7]], 1: [[1, 6], [4, 7], [0, 5], [2, 3], [2, 6], [3, 7], [6, 7], [0, 1], [1, 2], [3, 4], [4, 5], [2, 7], [3, 6]], 2: [[1, 2, 6], [3, 4, 7], [2, 3, 6], [2, 3, 7], [2, 6, 7], [3, 6, 7]]}
+
+    # Example 9 (VR, parallel)
+    print(VR(S,epsilon,workers=2) == VR(S,epsilon),'\n')
+    # Prints out:
+    # True
+
+    # Example 10 (VR on landmarks of example 6, every point within 1.5 of one)
+    print(landmarks(S,1.5), VR(S,epsilon,approx=1.5/epsilon),'\n')
+    # Prints out:
+    # [0, 2, 3, 4, 5, 6] {0: [(0,), (2,), (3,), (4,), (5,), (6,)], 1: [(0, 5), (2, 3), (2, 6), (3, 4), (3, 6), (4, 5)], 2: [(2, 3, 6)]}
+
     # Cliques of a fully-connected graph
-    n = 10  # < 1 sec
-    # n = 11  # < 3 sec
-    # n = 13  # ~ 50 sec
+    n = 13  # < 0.1 sec
+    # n = 20  # < 1 sec
     VG = [i for i in range(n)]
     EG = []
 
@@ -155,3 +537,20 @@ if __name__ == '__main__':
     ctr = perf_counter()
     _ = cliques(VG,EG)
     print(perf_counter() - ctr)
+
+    # Epsilon-graph of many random points
+    S = np.random.rand(10**5,2)
+
+    ctr = perf_counter()
+    _ = epsilon_graph(S,0.005)  # < 1 sec
+    print(perf_counter() - ctr)
+
+    # Its VR complex on landmarks, every point within 0.02 of one
+    ctr = perf_counter()
+    _ = VR(np.random.rand(10**6,2),0.04,max_dim=2,approx=0.5)  # ~ 5 sec
+    print(perf_counter() - ctr)
+
+    # 2-skeleton of its VR complex (as integer arrays)
+    ctr = perf_counter()
+    _ = skeleton(len(S),epsilon_graph(S,0.005),2)  # ~ 1 sec
+    print(perf_counter() - ctr)
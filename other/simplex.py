@@ -10,7 +10,7 @@ import numpy as np
 #####################################################################################################
 # Main
 
-def simplex(c, A, b, J, K):
+def simplex(c, A, b, J, K, refactor=50):
     """
     Implementation of the revised simplex method for linear programming.
     For reference: https://en.wikipedia.org/wiki/Revised_simplex_method
@@ -26,17 +26,27 @@ def simplex(c, A, b, J, K):
         b: vector of constraints
         J: vector of base variable indices
         K: vector of remaining indices
+        refactor: number of iterations between refactorizations of the basis
 
     Output:
         x: vector of non-negative variables, which solve the primary LP
+
+    The basis matrix A[:,J] is inverted (LU-factorized) once and then updated in product form
+    (an eta file, one eta column per pivot), so solves cost O(m^2) per iteration instead of
+    O(m^3). It is refactorized from scratch every refactor iterations for numerical stability.
     """
 
     x = np.zeros_like(c)
+    it = 0
 
     while True:
-        # Current base variables
-        Aj = A[:,J]
-        xj = np.linalg.solve(Aj, b)
+        # Current base variables (factorized anew every refactor iterations)
+        if it % refactor == 0:
+            Binv = np.linalg.inv(A[:,J])
+            etas = []
+
+        it += 1
+        xj = ftran(Binv, etas, b[:,0]).reshape(-1,1)
         
         # Associated objective coefficients
         cj = c[J,0]
@@ -45,7 +55,7 @@ def simplex(c, A, b, J, K):
         f = np.dot(cj, xj)
         
         # Dual vector y
-        y = np.linalg.solve(Aj.T, cj)
+        y = btran(Binv, etas, cj)
         
         # If ccT >= 0, the optimum has been reached
         ccT = c[K,0].T - np.dot(y.T, A[:,K])
@@ -58,17 +68,19 @@ def simplex(c, A, b, J, K):
         s = np.min(K[ccT < 0.])
         
         # If aa <= 0, the problem is unbounded
-        aa = np.linalg.solve(Aj, A[:,s])
+        aa = ftran(Binv, etas, A[:,s])
 
         if np.all(aa <= 0.):
             raise Exception('LP is unbounded.')
         
         # Otherwise, an appropriate variable (Bland's rule) is chosen to exit the base
+        a = aa
         aa = np.where(aa == 0., 1e-12, aa)
         v = np.divide(xj.T, aa)[0]
         r = np.min(J[v == np.min(v[v > 0.])])
         
-        # Update of base variable indices
+        # Update of base variable indices and of the basis inverse (an eta column)
+        etas.append((np.flatnonzero(J == r)[0], a))
         J[J == r] = s
         K[K == s] = r
     
@@ -114,6 +126,41 @@ def simplex2(c, A, b):
     return f2, x2
 
 
+#####################################################################################################
+# Auxiliary
+
+def ftran(Binv, etas, v):
+    """
+    Solves B*x = v for the current basis B, given the inverse of the refactorized basis and
+    the eta file of pivots since.
+    """
+
+    x = np.dot(Binv, v)
+
+    # Eta columns, in the order of pivots
+    for r, a in etas:
+        xr = x[r] / a[r]
+        x -= xr * a
+        x[r] = xr
+
+    return x
+
+
+def btran(Binv, etas, v):
+    """
+    Solves B'*y = v for the current basis B, given the inverse of the refactorized basis and
+    the eta file of pivots since.
+    """
+
+    w = np.array(v, dtype=float)
+
+    # Transposed eta columns, in reverse order
+    for r, a in reversed(etas):
+        w[r] = (w[r] - np.dot(a, w) + a[r]*w[r]) / a[r]
+
+    return np.dot(Binv.T, w)
+
+
 #####################################################################################################
 # Test
 
@@ -0,0 +1,90 @@
+from math import ceil, sqrt
+
+
+ENCODINGS = ('pairwise', 'sequential', 'product')
+
+
+def amo_clauses(X, top, encoding='pairwise'):
+    # At most one of the variables in X may hold
+    # Auxiliary variables are numbered after top, the new top is returned
+    if encoding == 'pairwise':
+        for j in range(len(X)-1):
+            for k in range(j+1, len(X)):
+                yield (-X[j], -X[k])
+
+        return top
+
+    elif encoding == 'sequential':
+        return (yield from sequential_clauses(X, top))
+
+    elif encoding == 'product':
+        return (yield from product_clauses(X, top))
+
+    raise ValueError('Unknown encoding: ' + str(encoding))
+
+
+def sequential_clauses(X, top):
+    # Sinz's sequential counter: s_i holds if any of x_1..x_i does
+    n = len(X)
+
+    if n < 2:
+        return top
+
+    S = list(range(top+1, top+n))
+
+    yield (-X[0], S[0])
+
+    for i in range(1, n-1):
+        yield (-X[i], S[i])
+        yield (-S[i-1], S[i])
+        yield (-X[i], -S[i-1])
+
+    yield (-X[n-1], -S[n-2])
+
+    return top + n-1
+
+
+def product_clauses(X, top):
+    # Chen's 2-product: place X on a p x q grid, at most one row and column
+    n = len(X)
+
+    if n <= 4:
+        return (yield from amo_clauses(X, top))
+
+    p = ceil(sqrt(n))
+    q = ceil(n / p)
+    U = list(range(top+1, top+p+1))
+    V = list(range(top+p+1, top+p+q+1))
+    top += p+q
+
+    for i in range(n):
+        r, c = divmod(i, q)
+        yield (-X[i], U[r])
+        yield (-X[i], V[c])
+
+    top = yield from product_clauses(U, top)
+    top = yield from product_clauses(V, top)
+
+    return top
+
+
+def amo_size(n, encoding='pairwise'):
+    # Number of auxiliary variables and clauses used for n variables
+    if encoding == 'pairwise':
+        return 0, n*(n-1)//2
+
+    elif encoding == 'sequential':
+        return (n-1, 3*n-4) if n > 1 else (0, 0)
+
+    elif encoding == 'product':
+        if n <= 4:
+            return amo_size(n)
+
+        p = ceil(sqrt(n))
+        q = ceil(n / p)
+        up, cp = amo_size(p, 'product')
+        uq, cq = amo_size(q, 'product')
+
+        return p+q + up+uq, 2*n + cp+cq
+
+    raise ValueError('Unknown encoding: ' + str(encoding))
@@ -0,0 +1,547 @@
+import numpy as np
+
+from nq_sat import nq_arrays
+from kg_sat import kg_arrays, dsatur, greedy_clique
+
+
+class Solver:
+    # CDCL with two watched literals, VSIDS, phase saving, Luby restarts
+    # and reduction of the learnt clauses by LBD and activity
+    # Clauses live in one flat literal list, clause c is
+    # lits[start[c]:start[c]+size[c]] and watches its first two literals
+
+    def __init__(self, varnum, lits=(), offs=(0,), decay=0.95, restart=100,
+                 reduce=2000, reduce_inc=300):
+        self.n = varnum
+        self.lits = []
+        self.start = []
+        self.size = []
+        self.watches = [[] for _ in range(2*varnum+1)]
+
+        self.assign = [0] * (varnum+1)
+        self.level = [0] * (varnum+1)
+        self.reason = [-1] * (varnum+1)
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+
+        self.activity = [0.] * (varnum+1)
+        self.inc = 1.
+        self.decay = decay
+        self.phase = [-1] * (varnum+1)
+        self.restart = restart
+        self.conflicts = 0
+        self.exhausted = False
+        self.ok = True
+
+        # Binary max-heap of variables by activity, pos[v] is -1 if absent
+        self.heap = list(range(1, varnum+1))
+        self.pos = list(range(-1, varnum))
+
+        # Learnt clauses: flag, LBD and activity per clause, reduced at
+        # reduce, reduce + reduce_inc, ... conflicts (Glucose-style)
+        self.learnt = []
+        self.lbd = []
+        self.cact = []
+        self.cinc = 1.
+        self.next_reduce = reduce
+        self.reduce_inc = reduce_inc
+
+        lits = np.asarray(lits, dtype=int).tolist()
+        offs = np.asarray(offs, dtype=int).tolist()
+
+        for i in range(len(offs)-1):
+            self.add_clause(lits[offs[i]:offs[i+1]])
+
+    def value(self, lit):
+        a = self.assign[abs(lit)]
+
+        return a if lit > 0 else -a
+
+    def add_clause(self, clause):
+        # Only at the root level, e.g. between calls of solve
+        if not self.ok:
+            return False
+
+        clause = list(dict.fromkeys(clause))
+
+        if any(-lit in clause for lit in clause):
+            return True
+
+        if any(self.value(lit) == 1 and not self.level[abs(lit)]
+               for lit in clause):
+            return True
+
+        clause = [lit for lit in clause
+                  if self.value(lit) != -1 or self.level[abs(lit)]]
+
+        if not clause:
+            self.ok = False
+            return False
+
+        if len(clause) == 1:
+            self.enqueue(clause[0], -1)
+            self.ok = self.propagate() == -1
+            return self.ok
+
+        self.store(clause)
+
+        return True
+
+    def store(self, clause, lbd=0):
+        # lbd > 0 marks a learnt clause
+        c = len(self.start)
+        self.start.append(len(self.lits))
+        self.size.append(len(clause))
+        self.learnt.append(lbd > 0)
+        self.lbd.append(lbd)
+        self.cact.append(0.)
+        self.lits.extend(clause)
+        self.watches[clause[0] + self.n].append(c)
+        self.watches[clause[1] + self.n].append(c)
+
+        return c
+
+    def enqueue(self, lit, reason):
+        v = abs(lit)
+        self.assign[v] = 1 if lit > 0 else -1
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        # Returns a conflicting clause or -1
+        lits = self.lits
+        start = self.start
+        size = self.size
+        watches = self.watches
+        assign = self.assign
+        n = self.n
+
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+            ws = watches[false_lit + n]
+            keep = []
+
+            for i, c in enumerate(ws):
+                s = start[c]
+
+                # Keep the false literal second
+                if lits[s] == false_lit:
+                    lits[s], lits[s+1] = lits[s+1], false_lit
+
+                first = lits[s]
+                a = assign[abs(first)]
+                first_val = a if first > 0 else -a
+
+                if first_val == 1:
+                    keep.append(c)
+                    continue
+
+                # Look for a new literal to watch
+                for k in range(s+2, s+size[c]):
+                    lit = lits[k]
+                    a = assign[abs(lit)]
+
+                    if (a if lit > 0 else -a) != -1:
+                        lits[s+1], lits[k] = lit, false_lit
+                        watches[lit + n].append(c)
+                        break
+                else:
+                    keep.append(c)
+
+                    if first_val == -1:
+                        keep.extend(ws[i+1:])
+                        watches[false_lit + n] = keep
+                        self.qhead = len(self.trail)
+                        return c
+
+                    self.enqueue(first, c)
+
+            watches[false_lit + n] = keep
+
+        return -1
+
+    def analyze(self, confl):
+        # First UIP learning, returns the clause and the backtrack level
+        lits = self.lits
+        level = self.level
+        dl = len(self.trail_lim)
+        seen = set()
+        learnt = [0]
+        counter = 0
+        p = 0
+        i = len(self.trail) - 1
+
+        while True:
+            s = self.start[confl]
+
+            if self.learnt[confl]:
+                self.bump_clause(confl)
+
+            for k in range(s + (p != 0), s + self.size[confl]):
+                q = lits[k]
+                v = abs(q)
+
+                if v not in seen and level[v] > 0:
+                    seen.add(v)
+                    self.bump(v)
+
+                    if level[v] == dl:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+
+            while abs(self.trail[i]) not in seen:
+                i -= 1
+
+            p = self.trail[i]
+            i -= 1
+            confl = self.reason[abs(p)]
+            seen.discard(abs(p))
+            counter -= 1
+
+            if not counter:
+                break
+
+        learnt[0] = -p
+
+        # Drop literals implied by the rest of the clause (local minimisation)
+        learnt = [learnt[0]] + [q for q in learnt[1:]
+                                if not self.redundant(q, seen)]
+
+        if len(learnt) == 1:
+            return learnt, 0, 1
+
+        # The literal of the highest remaining level is watched second
+        j = max(range(1, len(learnt)), key=lambda j: level[abs(learnt[j])])
+        learnt[1], learnt[j] = learnt[j], learnt[1]
+
+        # Literal block distance: number of decision levels in the clause
+        lbd = len({level[abs(q)] for q in learnt})
+
+        return learnt, level[abs(learnt[1])], lbd
+
+    def redundant(self, q, seen):
+        c = self.reason[abs(q)]
+
+        if c == -1:
+            return False
+
+        s = self.start[c]
+
+        return all(abs(lit) in seen or not self.level[abs(lit)]
+                   for lit in self.lits[s+1:s+self.size[c]])
+
+    def bump(self, v):
+        self.activity[v] += self.inc
+
+        if self.activity[v] > 1e100:
+            # Uniform rescaling keeps the heap order
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.inc *= 1e-100
+
+        if self.pos[v] >= 0:
+            self.heap_up(self.pos[v])
+
+    def bump_clause(self, c):
+        self.cact[c] += self.cinc
+
+        if self.cact[c] > 1e20:
+            self.cact = [a * 1e-20 for a in self.cact]
+            self.cinc *= 1e-20
+
+    def heap_up(self, i):
+        heap, pos, act = self.heap, self.pos, self.activity
+        v = heap[i]
+
+        while i:
+            p = (i-1) >> 1
+
+            if act[heap[p]] >= act[v]:
+                break
+
+            heap[i] = heap[p]
+            pos[heap[i]] = i
+            i = p
+
+        heap[i] = v
+        pos[v] = i
+
+    def heap_down(self, i):
+        heap, pos, act = self.heap, self.pos, self.activity
+        v = heap[i]
+        n = len(heap)
+
+        while 2*i + 1 < n:
+            j = 2*i + 1
+
+            if j+1 < n and act[heap[j+1]] > act[heap[j]]:
+                j += 1
+
+            if act[heap[j]] <= act[v]:
+                break
+
+            heap[i] = heap[j]
+            pos[heap[i]] = i
+            i = j
+
+        heap[i] = v
+        pos[v] = i
+
+    def heap_insert(self, v):
+        if self.pos[v] < 0:
+            self.pos[v] = len(self.heap)
+            self.heap.append(v)
+            self.heap_up(self.pos[v])
+
+    def backtrack(self, lvl):
+        if len(self.trail_lim) <= lvl:
+            return
+
+        for lit in self.trail[self.trail_lim[lvl]:]:
+            v = abs(lit)
+            self.assign[v] = 0
+            self.reason[v] = -1
+            self.phase[v] = 1 if lit > 0 else -1
+            self.heap_insert(v)
+
+        del self.trail[self.trail_lim[lvl]:]
+        del self.trail_lim[lvl:]
+        self.qhead = len(self.trail)
+
+    def pick(self):
+        heap, pos = self.heap, self.pos
+
+        while heap:
+            v = heap[0]
+            last = heap.pop()
+            pos[v] = -1
+
+            if heap:
+                heap[0] = last
+                pos[last] = 0
+                self.heap_down(0)
+
+            if not self.assign[v]:
+                return v
+
+        return 0
+
+    def reduce_db(self):
+        # Keep glue clauses (LBD <= 2), reasons, and the better half of the
+        # other learnt clauses by LBD and activity, then compact the store
+        reason = self.reason
+        lits, start, size = self.lits, self.start, self.size
+        learnts = [c for c in range(len(start)) if self.learnt[c]
+                   and self.lbd[c] > 2 and reason[abs(lits[start[c]])] != c]
+        learnts.sort(key=lambda c: (self.lbd[c], -self.cact[c]))
+        drop = set(learnts[len(learnts)//2:])
+
+        new = [-1] * len(start)
+        self.lits, self.start, self.size = [], [], []
+        learnt, lbd, cact = self.learnt, self.lbd, self.cact
+        self.learnt, self.lbd, self.cact = [], [], []
+        self.watches = [[] for _ in range(2*self.n+1)]
+
+        for c in range(len(start)):
+            if c not in drop:
+                new[c] = self.store(lits[start[c]:start[c]+size[c]], lbd[c])
+                self.cact[-1] = cact[c]
+
+        for v in range(1, self.n+1):
+            if reason[v] != -1:
+                reason[v] = new[reason[v]]
+
+    def solve(self, assumptions=(), budget=None):
+        # Returns a model (model[v] is True/False) or None if unsatisfiable,
+        # or None with exhausted set after budget conflicts without an answer
+        self.exhausted = False
+
+        if not self.ok:
+            return None
+
+        if budget is not None:
+            budget += self.conflicts
+
+        if self.propagate() != -1:
+            self.ok = False
+            return None
+
+        restarts = 0
+        limit = self.conflicts + luby(restarts) * self.restart
+
+        while True:
+            confl = self.propagate()
+
+            if confl != -1:
+                self.conflicts += 1
+
+                if not self.trail_lim:
+                    self.ok = False
+                    return None
+
+                learnt, lvl, lbd = self.analyze(confl)
+                self.backtrack(lvl)
+
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], -1)
+                else:
+                    self.enqueue(learnt[0], self.store(learnt, lbd))
+
+                self.inc /= self.decay
+                self.cinc /= 0.999
+                continue
+
+            if budget is not None and self.conflicts >= budget:
+                self.exhausted = True
+                self.backtrack(0)
+                return None
+
+            if self.conflicts >= self.next_reduce:
+                self.next_reduce += self.reduce_inc
+                self.reduce_inc += 300
+                self.reduce_db()
+
+            if self.conflicts >= limit:
+                restarts += 1
+                limit = self.conflicts + luby(restarts) * self.restart
+                self.backtrack(0)
+
+            # Assumptions are the first decisions
+            dl = len(self.trail_lim)
+
+            if dl < len(assumptions):
+                lit = assumptions[dl]
+                val = self.value(lit)
+
+                if val == -1:
+                    self.backtrack(0)
+                    return None
+
+                self.trail_lim.append(len(self.trail))
+
+                if not val:
+                    self.enqueue(lit, -1)
+
+                continue
+
+            v = self.pick()
+
+            if not v:
+                model = [a > 0 for a in self.assign]
+                self.backtrack(0)
+                return model
+
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(v * self.phase[v], -1)
+
+
+def luby(i):
+    # i-th element (0-based) of the Luby sequence 1 1 2 1 1 2 4 ...
+    size, seq = 1, 0
+
+    while size < i+1:
+        seq += 1
+        size = 2*size + 1
+
+    while size-1 != i:
+        size = (size-1) >> 1
+        seq -= 1
+        i %= size
+
+    return 1 << seq
+
+
+def solve(varnum, lits, offs, assumptions=()):
+    return Solver(varnum, lits, offs).solve(assumptions)
+
+
+def decode_nq(n, model):
+    # Column of the queen in each row
+    return [c for r in range(n) for c in range(n) if model[r*n + c+1]]
+
+
+def decode_kg(k, v, model):
+    # Colour (0 to k-1) of each vertex 1 to v
+    return [c for i in range(v) for c in range(k) if model[i*k + c+1]]
+
+
+def solve_nq(n, encoding='pairwise', symmetry=False):
+    cnf = nq_arrays(n, encoding, symmetry)
+
+    if cnf is None:
+        return None
+
+    model = solve(*cnf)
+
+    return None if model is None else decode_nq(n, model)
+
+
+def solve_kg(k, v, e, edges, encoding='pairwise', symmetry=False):
+    cnf = kg_arrays(k, v, e, edges, encoding, symmetry)
+
+    if cnf is None:
+        return None
+
+    model = solve(*cnf)
+
+    return None if model is None else decode_kg(k, v, model)
+
+
+def chromatic_number(v, e, edges, encoding='pairwise', symmetry=True,
+                     budget=None):
+    # Encode once for the DSatur bound K, then tighten k with assumptions
+    # Activation variable s_c disables colour c and implies s_c+1
+    # Returns bounds (upper, lower), equal unless a call runs out of its
+    # budget of conflicts, and a colouring with upper colours
+    colouring = dsatur(v, e, edges)
+    K = max(colouring) + 1 if v else 0
+
+    if K < 3:
+        return K, K, colouring
+
+    varnum, lits, offs = kg_arrays(K, v, e, edges, encoding, symmetry)
+    solver = Solver(varnum + K, lits, offs)
+    S = list(range(varnum+1, varnum+K+1))
+
+    for c in range(K):
+        if c < K-1:
+            solver.add_clause([-S[c], S[c+1]])
+
+        for i in range(v):
+            solver.add_clause([-S[c], -(i*K + c+1)])
+
+    upper = K
+    lower = len(greedy_clique(v, e, edges))
+
+    while upper > lower:
+        model = solver.solve([S[upper-1]], budget)
+
+        if model is None:
+            if not solver.exhausted:
+                lower = upper
+            break
+
+        colouring = decode_kg(K, v, model)
+        upper = max(colouring) + 1
+
+    return upper, lower, colouring
+
+
+if __name__ == '__main__':
+    import sys
+    from kg_sat import read_kg_graph
+
+    if sys.argv[1] == 'nq':
+        print(solve_nq(int(sys.argv[2])))
+
+    elif sys.argv[1] == 'chi':
+        v, e, edges = read_kg_graph(sys.argv[2])
+        budget = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(*chromatic_number(v, e, edges, budget=budget), sep='\n')
+
+    else:
+        v, e, edges = read_kg_graph(sys.argv[2])
+        print(solve_kg(int(sys.argv[3]), v, e, edges))
@@ -0,0 +1,116 @@
+"""DIMACS graph and CNF reading/writing (shared by sat and karger-analysis)"""
+
+import warnings
+import numpy as np
+
+
+def read_header(infile):
+    """Skip comments up to the problem line, return its fields"""
+    for line in infile:
+        fields = line.split()
+
+        if fields and fields[0] == 'p':
+            return fields[1], int(fields[2]), int(fields[3])
+
+        if fields and fields[0] != 'c':
+            raise ValueError('Expected a DIMACS problem line: ' + line)
+
+    raise ValueError('Missing DIMACS problem line')
+
+
+def read_graph(filename, dtype='uint16', chunk=2**20, mmap=None):
+    """Read an edge list in chunks, optionally into a memory-mapped .npy"""
+    with open(filename, 'r') as infile:
+        _, numv, nume = read_header(infile)
+
+        # Widen the requested dtype if vertex labels would overflow it
+        dtype = np.promote_types(dtype, np.min_scalar_type(numv))
+
+        if mmap is None:
+            edges = np.empty([nume, 2], dtype=dtype)
+        else:
+            edges = np.lib.format.open_memmap(mmap, mode='w+', dtype=dtype,
+                                              shape=(nume, 2))
+
+        # Comment lines do not count towards max_rows, which numpy warns about
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+
+            for i in range(0, nume, chunk):
+                rows = min(chunk, nume-i)
+                edges[i:i+rows] = np.loadtxt(infile, usecols=(1,2),
+                                             dtype=dtype, comments='c',
+                                             max_rows=rows, ndmin=2)
+
+    if mmap is not None:
+        edges.flush()
+
+    return numv, edges
+
+
+def write_graph(outfile, numv, edges, chunk=2**16):
+    """Write an edge list in chunks ('p edge' problem line)"""
+    outfile.write('p edge ' + str(numv) + ' ' + str(len(edges)) + '\n')
+
+    for i in range(0, len(edges), chunk):
+        E = np.asarray(edges[i:i+chunk]).tolist()
+        outfile.write(''.join('e %d %d\n' % (u, v) for u, v in E))
+
+
+def read_cnf(filename, chunk=2**16):
+    """Read clauses as a flat int32 literal array and clause offsets"""
+    lits = []
+    ends = []
+    base = 0
+
+    with open(filename, 'r') as infile:
+        _, varnum, _ = read_header(infile)
+
+        done = False
+
+        while not done:
+            lines = [line for _, line in zip(range(chunk), infile)]
+
+            if not lines:
+                break
+
+            # SATLIB files end their clauses with a '%' line
+            for i, line in enumerate(lines):
+                if line.lstrip().startswith('%'):
+                    lines = lines[:i]
+                    done = True
+                    break
+
+            # Literals never contain a 'c', so anything after one is a comment
+            text = ' '.join(line.split('c', 1)[0] for line in lines)
+            L = np.fromstring(text, dtype='int64', sep=' ')
+
+            # Clauses may span lines and chunks, zeros terminate them
+            zeros = np.flatnonzero(L == 0)
+            ends.append(zeros - np.arange(len(zeros)) + base)
+            lits.append(L[L != 0].astype('int32'))
+            base += len(lits[-1])
+
+    offs = np.concatenate([[0]] + ends).astype('int64')
+    lits = np.concatenate(lits) if lits else np.empty(0, dtype='int32')
+
+    return varnum, lits, offs
+
+
+def clause_offsets(lens):
+    """Offsets of clauses of the given lengths in a flat literal array"""
+    offs = np.zeros(len(lens)+1, dtype='int64')
+    np.cumsum(lens, out=offs[1:])
+
+    return offs
+
+
+def write_cnf(outfile, varnum, lits, offs, chunk=2**16):
+    """Write DIMACS CNF, formatted a chunk of clauses at a time"""
+    outfile.write('p cnf ' + str(varnum) + ' ' + str(len(offs)-1) + '\n')
+
+    for i in range(0, len(offs)-1, chunk):
+        j = min(i+chunk, len(offs)-1)
+        L = np.insert(lits[offs[i]:offs[j]], offs[i+1:j+1] - offs[i], 0)
+        outfile.write(' '.join(map(str, L.tolist())).replace(' 0 ', ' 0\n')
+                      + '\n')
@@ -1,49 +1,164 @@
-def reduce_kg_sat(k, v, e, edges):
+from heapq import heapify, heappush, heappop
+
+import numpy as np
+
+from amo import amo_clauses, amo_size
+from dimacs import read_graph, clause_offsets
+
+
+def kg_clause_arrays(k, v, e, edges, encoding='pairwise'):
+    # Variable table: row i holds the colour variables of vertex i
+    kv = np.arange(1, k*v+1).reshape(v, k)
+    kv = np.vstack((np.zeros([1, k], dtype=int), kv))
+
+    # Vertices: at least one colour, followed by at most one
+    # Every vertex reuses the template of a single one, shifted to its variables
+    aux, _ = amo_size(k, encoding)
+    T = np.array(list(amo_clauses(range(1, k+1), k, encoding)),
+                 dtype=int).reshape(-1, 2)
+    X = np.abs(T)
+    I = np.arange(v).reshape(-1, 1, 1)
+    amo = np.where(X <= k, I*k + X, k*v + I*aux + X - k) * np.sign(T)
+    vertices = np.hstack((kv[1:], amo.reshape(v, -1)))
+
+    # Edges: endpoints may not share a colour
+    E = np.asarray(edges, dtype=int)[:e].reshape(-1, 2)
+    conflicts = np.stack((-kv[E[:, 0]], -kv[E[:, 1]]), axis=2)
+
+    return vertices, conflicts
+
+
+def kg_preamble(k, v, e, encoding='pairwise', fixed=0):
+    aux, amo = amo_size(k, encoding)
+
+    return k*v + aux*v, v*(1 + amo) + k*e + fixed
+
+
+def greedy_clique(v, e, edges):
+    # Grow a clique from the highest degree vertex, preferring high degrees
+    G = [set() for _ in range(v+1)]
+
+    for (v1, v2) in np.asarray(edges)[:e].tolist():
+        if v1 != v2:
+            G[v1].add(v2)
+            G[v2].add(v1)
+
+    if not v:
+        return []
+
+    clique = [max(range(1, v+1), key=lambda i: len(G[i]))]
+    candidates = set(G[clique[0]])
+
+    while candidates:
+        u = max(candidates, key=lambda i: (len(G[i]), -i))
+        clique.append(u)
+        candidates &= G[u]
+
+    return clique
+
+
+def dsatur(v, e, edges):
+    # Greedy DSatur colouring (colours 0, 1, ...) of vertices 1 to v
+    G = [set() for _ in range(v+1)]
+
+    for (v1, v2) in np.asarray(edges)[:e].tolist():
+        if v1 != v2:
+            G[v1].add(v2)
+            G[v2].add(v1)
+
+    colour = [-1] * (v+1)
+    seen = [set() for _ in range(v+1)]
+    heap = [(0, -len(G[i]), i) for i in range(1, v+1)]
+    heapify(heap)
+
+    while heap:
+        sat, _, u = heappop(heap)
+
+        # Skip coloured vertices and outdated saturation entries
+        if colour[u] >= 0 or -sat != len(seen[u]):
+            continue
+
+        c = 0
+
+        while c in seen[u]:
+            c += 1
+
+        colour[u] = c
+
+        for w in G[u]:
+            if colour[w] < 0 and c not in seen[w]:
+                seen[w].add(c)
+                heappush(heap, (-len(seen[w]), -len(G[w]), w))
+
+    return colour[1:]
+
+
+def kg_symmetry_clauses(k, v, e, edges):
+    # Colour permutations: the i-th clique vertex gets colour i
+    # (a clique larger than k is left to the edge clauses to refute)
+    clique = greedy_clique(v, e, edges)[:k]
+
+    return [((u-1)*k + i+1,) for i, u in enumerate(clique)]
+
+
+def kg_arrays(k, v, e, edges, encoding='pairwise', symmetry=False):
+    if k < 2:
+        return None
+
+    fixed = kg_symmetry_clauses(k, v, e, edges) if symmetry else []
+    preamble = kg_preamble(k, v, e, encoding, len(fixed))
+    vertices, conflicts = kg_clause_arrays(k, v, e, edges, encoding)
+
+    # Per vertex: one clause of k literals, then binary clauses
+    amo = (vertices.shape[1] - k) // 2
+    lens = ([k] + [2]*amo) * v + [2] * (conflicts.size//2)
+    lens += [1] * len(fixed)
+    lits = np.concatenate((vertices.ravel(), conflicts.ravel(),
+                           np.ravel(fixed))).astype('int32')
+
+    return preamble[0], lits, clause_offsets(lens)
+
+
+def reduce_kg_sat(k, v, e, edges, encoding='pairwise', symmetry=False):
     # Confirm feasibility
     if k < 2:
         return None
 
+    # Symmetry breaking
+    fixed = kg_symmetry_clauses(k, v, e, edges) if symmetry else []
+
     # Preamble
-    varnum = k*v
-    clauses = v*(1 + k*(k-1)//2) + k*e
+    varnum, clauses = kg_preamble(k, v, e, encoding, len(fixed))
     dimacs = 'p cnf ' + str(varnum) + ' ' + str(clauses) + '\n'
 
     # Clauses
-    # Vertices
-    for i in range(1, varnum+1, k):
-        dimacs += ' '.join([str(i+j) for j in range(k)]) + ' 0\n'
+    vertices, conflicts = kg_clause_arrays(k, v, e, edges, encoding)
 
-        for m in range(i, i+k-1):
-            for n in range(m+1, i+k):
-                dimacs += str(-m) + ' ' + str(-n) + ' 0\n'
+    # Format each block in a single pass
+    amo = (vertices.shape[1] - k) // 2
+    block = '%d '*k + '0\n' + '%d %d 0\n' * amo
+    dimacs += (block * v) % tuple(vertices.ravel().tolist())
+    dimacs += ('%d %d 0\n' * (k*e)) % tuple(conflicts.ravel().tolist())
+    dimacs += ''.join('%d 0\n' % clause for clause in fixed)
 
-    # Edges
-    kv = [[0, 0]]
+    return dimacs
 
-    for i in range(1, k*v+1, k):
-        kv.append(list(range(i, i+k)))
 
-    for i in range(e):
-        for j in range(k):
-            dimacs += str(-kv[edges[i][0]][j]) + ' ' + str(-kv[edges[i][1]][j]) + ' 0\n'
+def read_kg_graph(filename):
+    v, edges = read_graph(filename)
 
-    return dimacs
+    return v, len(edges), edges
 
 
 if __name__ == '__main__':
     import sys
 
-    with open(sys.argv[1], 'r') as in_file:
-        (v, e) = in_file.readline()[:-1].split(' ')[2:]
-        (v, e) = (int(v), int(e))
-
-        edges = [(0, 0)] * e
-
-        for edge in range(e):
-            (v1, v2) = in_file.readline()[2:-1].split(' ')
-            edges[edge] = (int(v1), int(v2))
+    v, e, edges = read_kg_graph(sys.argv[1])
 
-    sat_reduction = reduce_kg_sat(int(sys.argv[2]), v, e, edges)
+    encoding = sys.argv[4] if len(sys.argv) > 4 else 'pairwise'
+    symmetry = len(sys.argv) > 5 and sys.argv[5] == 'sym'
+    sat_reduction = reduce_kg_sat(int(sys.argv[2]), v, e, edges, encoding,
+                                  symmetry)
     # print(sat_reduction)
 
     with open(sys.argv[3], 'w') as outfile:
@@ -1,69 +1,188 @@
-def reduce_nq_sat(n):
+from itertools import chain
+
+import numpy as np
+
+from amo import amo_clauses, amo_size
+from dimacs import clause_offsets
+
+
+def nq_preamble(n, encoding='pairwise', symmetry=False):
     # Confirm feasibility
     if n < 4:
         return None
 
     # Preamble
     varnum = n ** 2
-    clauses = 2*n + (n-1)*n*(n+1)
-    m = n-1
 
-    while m > 1:
-        clauses += 2 * m*(m-1)
-        m -= 1
+    if encoding == 'pairwise':
+        clauses = 2*n + (n-1)*n*(n+1)
+        m = n-1
+
+        while m > 1:
+            clauses += 2 * m*(m-1)
+            m -= 1
+
+    else:
+        clauses = 0
 
-    dimacs = 'p cnf ' + str(varnum) + ' ' + str(clauses) + '\n'
+        for alo, X in nq_lines(n):
+            aux, amo = amo_size(len(X), encoding)
+            varnum += aux
+            clauses += alo + amo
+
+    if symmetry:
+        for sigma in nq_symmetries(n):
+            m = sum(1 for i, j in enumerate(sigma) if i != j)
+
+            if m:
+                varnum += m-1
+                clauses += 3*m-2
+
+    return varnum, clauses
+
+
+def nq_lines(n):
+    # Rows, columns and diagonals, flagged if a queen is required on them
+    varnum = n ** 2
 
-    # Clauses
     # Rows
     for i in range(1, varnum+1, n):
-        dimacs += ' '.join([str(i+j) for j in range(n)]) + ' 0\n'
-
-        for j in range(i, i+n-1):
-            for k in range(j+1, i+n):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield True, range(i, i+n)
 
     # Columns
     for i in range(1, n+1):
-        dimacs += ' '.join([str(i+j) for j in range(0, varnum, n)]) + ' 0\n'
-
-        for j in range(i, varnum, n):
-            for k in range(j+n, varnum+1, n):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield True, range(i, varnum+1, n)
 
     # Upper LR diagonals
     for i in range(n-1, 0, -1):
-        for j in range(i, n*(n-i+1), n+1):
-            for k in range(j+n+1, n*(n-i+1)+1, n+1):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield False, range(i, n*(n-i+1)+1, n+1)
 
     # Lower LR diagonals
     for i in range(n+1, n*(n-2)+2, n):
-        for j in range(i, varnum - i//n, n+1):
-            for k in range(j+n+1, varnum - i//n + 1, n+1):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield False, range(i, varnum - i//n + 1, n+1)
 
     # Upper RL diagonals
     for i in range(2, n+1):
-        for j in range(i, i + (n-1)*(i-1), n-1):
-            for k in range(j+n-1, i + (n-1)*(i-1) + 1, n-1):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield False, range(i, i + (n-1)*(i-1) + 1, n-1)
 
     # Lower RL diagonals
     for i in range(2*n, varnum, n):
-        for j in range(i, varnum - n + i//n, n-1):
-            for k in range(j+n-1, varnum - n + i//n + 1, n-1):
-                dimacs += str(-j) + ' ' + str(-k) + ' 0\n'
+        yield False, range(i, varnum - n + i//n + 1, n-1)
+
+
+def nq_clauses(n, encoding='pairwise', symmetry=False):
+    top = n ** 2
+
+    for alo, X in nq_lines(n):
+        if alo:
+            yield tuple(X)
+
+        top = yield from amo_clauses(X, top, encoding)
+
+    if symmetry:
+        for sigma in nq_symmetries(n):
+            top = yield from lex_leader_clauses(sigma, top)
+
+
+def nq_symmetries(n):
+    # The 7 non-trivial board symmetries as 0-based square permutations
+    r, c = np.divmod(np.arange(n ** 2), n)
+    m = n-1
+
+    for R, C in ((c, m-r), (m-r, m-c), (m-c, r),
+                 (r, m-c), (m-r, c), (c, r), (m-c, m-r)):
+        yield (R*n + C).tolist()
+
+
+def lex_leader_clauses(sigma, top):
+    # Assignment x must be lexicographically <= its image x[sigma]
+    # e_i holds while the prefixes up to i are equal
+    P = [i for i, j in enumerate(sigma) if i != j]
+    e = None
+
+    for t, i in enumerate(P):
+        x, y = i+1, sigma[i]+1
+        prefix = () if e is None else (-e,)
+
+        yield prefix + (-x, y)
 
-    return dimacs
+        if t < len(P)-1:
+            top += 1
+            yield prefix + (-x, -y, top)
+            yield prefix + (x, y, top)
+            e = top
+
+    return top
+
+
+def nq_arrays(n, encoding='pairwise', symmetry=False):
+    # Clauses as a flat int32 literal array, clause i is lits[offs[i]:offs[i+1]]
+    preamble = nq_preamble(n, encoding, symmetry)
+
+    if preamble is None:
+        return None
+
+    clauses = list(nq_clauses(n, encoding, symmetry))
+    lens = [len(clause) for clause in clauses]
+    lits = np.fromiter(chain.from_iterable(clauses), dtype='int32',
+                       count=sum(lens))
+
+    return preamble[0], lits, clause_offsets(lens)
+
+
+def dimacs_lines(varnum, clauses, clause_iter):
+    yield 'p cnf ' + str(varnum) + ' ' + str(clauses) + '\n'
+
+    for clause in clause_iter:
+        yield ' '.join(map(str, clause)) + ' 0\n'
+
+
+def write_dimacs(outfile, lines, chunk=1 << 16):
+    # Buffer lines into chunks to keep writes large and memory constant
+    buffer = []
+
+    for line in lines:
+        buffer.append(line)
+
+        if len(buffer) == chunk:
+            outfile.write(''.join(buffer))
+            buffer = []
+
+    outfile.write(''.join(buffer))
+
+
+def write_nq_sat(n, outfile, encoding='pairwise', symmetry=False):
+    preamble = nq_preamble(n, encoding, symmetry)
+
+    if preamble is None:
+        return False
+
+    clauses = nq_clauses(n, encoding, symmetry)
+    write_dimacs(outfile, dimacs_lines(*preamble, clauses))
+
+    return True
+
+
+def reduce_nq_sat(n, encoding='pairwise', symmetry=False):
+    preamble = nq_preamble(n, encoding, symmetry)
+
+    if preamble is None:
+        return None
+
+    clauses = nq_clauses(n, encoding, symmetry)
+
+    return ''.join(dimacs_lines(*preamble, clauses))
 
 
 # Test
 if __name__ == '__main__':
     import sys
 
-    sat_reduction = reduce_nq_sat(int(sys.argv[1]))
+    # sat_reduction = reduce_nq_sat(int(sys.argv[1]))
     # print(sat_reduction)
 
+    encoding = sys.argv[3] if len(sys.argv) > 3 else 'pairwise'
+    symmetry = len(sys.argv) > 4 and sys.argv[4] == 'sym'
+
     with open(sys.argv[2], 'w') as outfile:
-        outfile.write(sat_reduction)
+        write_nq_sat(int(sys.argv[1]), outfile, encoding, symmetry)
@@ -0,0 +1,117 @@
+import os
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dimacs import write_cnf
+from nq_sat import nq_arrays
+from kg_sat import kg_arrays, read_kg_graph
+
+# Optional zstd support
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+FORMATS = {'gz': '.cnf.gz', 'zst': '.cnf.zst', 'bin': '.npz'}
+
+
+def job_clauses(job, encoding='pairwise', symmetry=False):
+    if job[0] == 'nq':
+        return nq_arrays(job[1], encoding, symmetry)
+
+    elif job[0] == 'kg':
+        graph, k = job[1:]
+
+        if k < 2:
+            return None
+
+        return kg_arrays(k, *read_kg_graph(graph), encoding, symmetry)
+
+    raise ValueError('Unknown job: ' + str(job))
+
+
+def job_name(job):
+    if job[0] == 'nq':
+        return 'nq-' + str(job[1])
+
+    graph = os.path.splitext(os.path.basename(job[1]))[0]
+
+    return 'kg_' + graph + '-' + str(job[2])
+
+
+def run_job(task):
+    job, out_dir, fmt, encoding, symmetry = task
+    data = job_clauses(job, encoding, symmetry)
+
+    if data is None:
+        return None
+
+    varnum, lits, offs = data
+    path = os.path.join(out_dir, job_name(job) + FORMATS[fmt])
+
+    if fmt == 'bin':
+        np.savez_compressed(path, varnum=varnum, literals=lits, offsets=offs)
+
+    elif fmt == 'gz':
+        with gzip.open(path, 'wt') as outfile:
+            write_cnf(outfile, varnum, lits, offs)
+
+    elif fmt == 'zst':
+        if zstandard is None:
+            raise ImportError('zstd output requires the zstandard package')
+
+        with zstandard.open(path, 'wt') as outfile:
+            write_cnf(outfile, varnum, lits, offs)
+
+    return path
+
+
+def run_batch(jobs, out_dir, fmt='gz', encoding='pairwise', symmetry=False,
+              workers=None):
+    # Jobs are ('nq', n) or ('kg', graph file, k)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(job, out_dir, fmt, encoding, symmetry) for job in jobs]
+
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run_job, tasks))
+
+
+def read_bin(path):
+    data = np.load(path)
+
+    return int(data['varnum']), data['literals'], data['offsets']
+
+
+def parse_job(arg):
+    # nq:8 or kg:g1.txt:3
+    parts = arg.split(':')
+
+    if parts[0] == 'nq':
+        return 'nq', int(parts[1])
+
+    return 'kg', parts[1], int(parts[2])
+
+
+if __name__ == '__main__':
+    import sys
+
+    out_dir = sys.argv[1]
+    fmt = sys.argv[2]
+    args = sys.argv[3:]
+
+    # Trailing <encoding> [sym], as for nq_sat.py and kg_sat.py
+    symmetry = args[-1:] == ['sym']
+
+    if symmetry:
+        args = args[:-1]
+
+    encoding = args.pop() if args and ':' not in args[-1] else 'pairwise'
+    jobs = [parse_job(arg) for arg in args]
+
+    # Infeasible jobs (n < 4 queens, k < 2 colours) produce no instance
+    for job, path in zip(jobs, run_batch(jobs, out_dir, fmt, encoding,
+                                         symmetry)):
+        print(path if path is not None else job_name(job) + ': no instance')